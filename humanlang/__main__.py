@@ -1,20 +1,61 @@
 # humanlang/__main__.py
+import argparse
 import asyncio
 import sys
-from .core.interpreter import HumanLang
 
-async def _main_async():
-    if len(sys.argv) < 2:
-        print("Usage: humanlang <yourfile.human>")
-        sys.exit(1)
+# The interpreter is imported only when a script runs here, so 'humanlang client'
+# starts without loading scapy and aiohttp.
+
+def _parse_args(argv):
+    from .core.profiler import SORT_KEYS
+    parser = argparse.ArgumentParser(
+        prog='humanlang',
+        usage="humanlang [--profile] [--profile-output FILE] <yourfile.human>\n"
+              "       humanlang bench [workload ...] [--repeat N] [--save FILE] [--compare FILE]\n"
+              "       humanlang serve [--socket PATH]\n"
+              "       humanlang client <yourfile.human> [--socket PATH]")
+    parser.add_argument('file', help="the .human script to run")
+    parser.add_argument('--profile', action='store_true',
+                        help="time every statement and task, and print a report when the script ends")
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help="write the profile as collapsed stacks for flamegraph tools (implies --profile)")
+    parser.add_argument('--profile-sort', choices=SORT_KEYS, default='self', help="report order (default: self)")
+    parser.add_argument('--profile-limit', type=int, default=25, help="rows per report section (default: 25)")
+    return parser.parse_args(argv)
 
-    filepath = sys.argv[1]
-    interpreter = HumanLang()
-    await interpreter.run_from_file(filepath)
+async def _main_async(args):
+    from .core.interpreter import HumanLang
+    from .core.profiler import Profiler
+    profiler = Profiler() if args.profile or args.profile_output else None
+    interpreter = HumanLang(profiler=profiler)
+    try:
+        if profiler:
+            profiler.start()
+        await interpreter.run_from_file(args.file)
+    finally:
+        await interpreter.close()
+        if profiler:
+            profiler.stop()
+            if args.profile_output:
+                profiler.write_collapsed(args.profile_output)
+                print(f"Profile written to {args.profile_output}", file=sys.stderr)
+            if args.profile or not args.profile_output:
+                profiler.print_report(args.profile_sort, args.profile_limit)
 
-def main():              
+def main():
+    if sys.argv[1:2] == ['bench']:
+        from .bench import main as bench_main
+        sys.exit(bench_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['serve']:
+        from .server import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    if sys.argv[1:2] == ['client']:
+        from .client import main as client_main
+        sys.exit(client_main(sys.argv[2:]))
+    args = _parse_args(sys.argv[1:])
     try:
-        asyncio.run(_main_async())
+        asyncio.run(_main_async(args))
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        from .core.parser import describe
+        print(f"An unexpected error occurred: {describe(e)}")
         sys.exit(1)
@@ -0,0 +1 @@
+from .runner import main, run_benchmarks, compare, workloads
@@ -0,0 +1,307 @@
+import io
+import os
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import tempfile
+import tracemalloc
+import contextlib
+from aiohttp import web
+from ..core.interpreter import HumanLang
+from ..core.executor import Executor
+from ..core.http import HttpClient
+from ..core.scanner import PortScanner, FakePacketLayer
+from ..core.parser import parse_code, read_statements
+
+WORKLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'workloads')
+BASELINE_VERSION = 1
+# Not a script: parses a large generated one, the way tooling-written scans of whole networks look.
+PARSE_WORKLOAD = 'parse'
+PARSE_HOSTS = 20000
+# Not a script file either: runs the real pooled HTTP client against a local aiohttp server.
+HTTP_WORKLOAD = 'http'
+HTTP_SEQUENTIAL = 200
+HTTP_BULK = 500
+
+
+class CountingExecutor(Executor):
+    """An Executor that counts every statement it runs."""
+    def __init__(self, interpreter):
+        super().__init__(interpreter)
+        self.statements = 0
+
+    async def execute(self, code, env):
+        for ins in code:
+            self.statements += 1
+            if ins.is_async:
+                returned = await ins.op(self, ins, env)
+            else:
+                returned = ins.op(self, ins, env)
+            if returned is not None:
+                return returned
+
+
+class StubHttpClient:
+    """Answers every request at once with a fixed body, so workloads never touch the network."""
+    body = '{"ok": true}'
+
+    async def get_text(self, url):
+        await asyncio.sleep(0)
+        return self.body
+
+    async def get_all(self, urls):
+        return [await self.get_text(url) for url in urls]
+
+    async def close(self):
+        pass
+
+
+def workloads(names=None):
+    """{name: path} of the bundled workloads, optionally only those named."""
+    found = {os.path.splitext(f)[0]: os.path.join(WORKLOAD_DIR, f)
+             for f in sorted(os.listdir(WORKLOAD_DIR)) if f.endswith('.human')}
+    found[PARSE_WORKLOAD] = None
+    found[HTTP_WORKLOAD] = None
+    if names:
+        unknown = [n for n in names if n not in found]
+        if unknown:
+            raise ValueError(f"Unknown workload(s): {', '.join(unknown)}. Available: {', '.join(found)}")
+        found = {n: found[n] for n in names}
+    return found
+
+
+def _interpreter(executor_class=Executor, http=None):
+    interpreter = HumanLang(http=http or StubHttpClient())
+    interpreter.executor = executor_class(interpreter)
+    interpreter.executor.scanner = PortScanner(FakePacketLayer(open_ports={22, 80, 443}), window=8)
+    return interpreter
+
+
+async def _run_once(path, executor_class=Executor, http=None):
+    """Compiles and runs a workload in a fresh interpreter, returning (compile seconds, run seconds, interpreter)."""
+    interpreter = _interpreter(executor_class, http)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        interpreter.path = path
+        compiled = await interpreter.compile_file(path, os.path.dirname(path))
+        compiled_at = time.perf_counter()
+        await interpreter.executor.execute(compiled.program, interpreter.global_env)
+        finished = time.perf_counter()
+    await interpreter.close()
+    return compiled_at - started, finished - compiled_at, interpreter
+
+
+async def measure(path, repeat=5, http=None):
+    """
+    Benchmarks one workload: timed runs, then one counting run and one traced run.
+    'http' makes a fresh HTTP client for each run; by default requests are stubbed.
+    """
+    new_http = http or StubHttpClient
+    timings = [await _run_once(path, http=new_http()) for _ in range(repeat)]
+    compile_times = [t[0] for t in timings]
+    run_times = [t[1] for t in timings]
+    _, _, counted = await _run_once(path, CountingExecutor, new_http())
+    statements = counted.executor.statements
+
+    tracemalloc.start()
+    try:
+        await _run_once(path, http=new_http())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(run_times)
+    return {
+        'statements': statements,
+        'seconds': best,
+        'median_seconds': statistics.median(run_times),
+        'compile_seconds': min(compile_times),
+        'ops_per_sec': statements / best if best else 0.0,
+        'us_per_statement': best / statements * 1e6 if statements else 0.0,
+        'peak_kib': peak / 1024,
+    }
+
+
+def _generate_script(path, hosts):
+    """Writes a long script: one 'set' per host, then a task and loops over them."""
+    with open(path, 'w') as f:
+        for i in range(hosts):
+            f.write(f'set host_{i} to "10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}".\n')
+        f.write('define a task named "check" that accepts "address" of type String and returns a Boolean.\n')
+        f.write('    if address is equal to "" then\n        return false\n    end if\n    return true\nend task\n')
+        for i in range(0, hosts, 10):
+            f.write(f'if host_{i} is equal to "" then\n    show me "empty"\nelse\n'
+                    f'    perform "check" with host_{i} and store the result in ok\nend if\n')
+
+
+def measure_parse(repeat=5, hosts=PARSE_HOSTS):
+    """Benchmarks reading and parsing a generated script; 'statements' counts its source lines."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'generated.human')
+        _generate_script(path, hosts)
+        with open(path) as f:
+            lines = sum(1 for _ in f)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            parse_code(read_statements(path))
+            timings.append(time.perf_counter() - started)
+        tracemalloc.start()
+        try:
+            parse_code(read_statements(path))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    best = min(timings)
+    return {
+        'statements': lines,
+        'seconds': best,
+        'median_seconds': statistics.median(timings),
+        'compile_seconds': best,
+        'ops_per_sec': lines / best if best else 0.0,
+        'us_per_statement': best / lines * 1e6 if lines else 0.0,
+        'peak_kib': peak / 1024,
+    }
+
+
+def _http_script(path, base_url, sequential=HTTP_SEQUENTIAL, bulk=HTTP_BULK):
+    """Writes a script making sequential requests, one bulk request and one request that fails."""
+    urls = ', '.join(f'"{base_url}/item/{i}"' for i in range(bulk))
+    with open(path, 'w') as f:
+        f.write(f'Set i to 0.\nWhile i is less than {sequential}.\n'
+                f'    Perform an http get request to "{base_url}/item/" + i and store the result in body.\n'
+                f'    Add 1 to i.\nEnd while.\n'
+                f'Set urls to [{urls}].\n'
+                f'Perform an http get request to each of urls and store the results in bodies.\n'
+                f'Set failed to 0.\nTry to\n'
+                f'    Perform an http get request to "{base_url}/missing" and store the result in body.\n'
+                f'On error\n    Add 1 to failed.\nEnd try.\n')
+
+
+async def measure_http(repeat=5):
+    """
+    Benchmarks the pooled HTTP client against a local aiohttp server, and checks
+    that it behaves: every request reuses the pool's keep-alive connections (no
+    more of them than the per-host limit) and a 404 raises an error the script catches.
+    """
+    connections = set()
+
+    async def item(request):
+        connections.add(request.transport.get_extra_info('peername'))
+        return web.Response(text='{"ok": true}')
+
+    app = web.Application()
+    app.router.add_get('/item/{n}', item)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    try:
+        host, port = runner.addresses[0][:2]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'http.human')
+            _http_script(path, f"http://{host}:{port}")
+            result = await measure(path, repeat, http=HttpClient)
+            connections.clear()
+            _, _, checked = await _run_once(path, http=HttpClient())
+    finally:
+        await runner.cleanup()
+    env = checked.global_env
+    if len(env.get('bodies')) != HTTP_BULK or env.get('failed') != 1:
+        raise RuntimeError("The http workload got wrong answers from the local server.")
+    if len(connections) > checked.http.limit_per_host:
+        raise RuntimeError(f"The http workload opened {len(connections)} connections; the pool allows "
+                           f"{checked.http.limit_per_host} per host.")
+    return result
+
+
+def run_benchmarks(names=None, repeat=5):
+    results = {}
+    for name, path in workloads(names).items():
+        if name == PARSE_WORKLOAD:
+            results[name] = measure_parse(repeat)
+        elif name == HTTP_WORKLOAD:
+            results[name] = asyncio.run(measure_http(repeat))
+        else:
+            results[name] = asyncio.run(measure(path, repeat))
+    return {
+        'version': BASELINE_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold=10.0):
+    """
+    Lines comparing each workload's time with the baseline, and whether any got
+    slower than the threshold (a percentage). A workload that now runs a different
+    number of statements was edited, so it is compared by time per statement.
+    """
+    lines, regressed = [], False
+    for name, current in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            lines.append(f"{name:<16} {'new':>10}")
+            continue
+        key, unit, scale, note = 'seconds', 'ms', 1000, ''
+        if before['statements'] != current['statements']:
+            key, unit, scale, note = 'us_per_statement', 'us', 1, '  (workload changed; per statement)'
+        change = (current[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+        flag = ''
+        if change > threshold:
+            flag, regressed = '  REGRESSION', True
+        elif change < -threshold:
+            flag = '  faster'
+        lines.append(f"{name:<16} {before[key] * scale:>9.2f}{unit} -> {current[key] * scale:>9.2f}{unit} "
+                     f"{change:>+7.1f}%{flag}{note}")
+    return lines, regressed
+
+
+def format_report(report):
+    lines = [f"{'workload':<16} {'statements':>10} {'time':>10} {'ops/sec':>12} {'us/stmt':>8} "
+             f"{'compile':>9} {'peak mem':>10}"]
+    for name, r in report['results'].items():
+        lines.append(f"{name:<16} {r['statements']:>10} {r['seconds'] * 1000:>8.2f}ms {r['ops_per_sec']:>12,.0f} "
+                     f"{r['us_per_statement']:>8.2f} {r['compile_seconds'] * 1000:>7.2f}ms {r['peak_kib']:>8.0f}KiB")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='humanlang bench', description="Benchmark the HumanLang interpreter.")
+    parser.add_argument('workloads', nargs='*', help="workloads to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per workload; the fastest counts")
+    parser.add_argument('--save', metavar='FILE', help="write the results to a JSON baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare against a saved JSON baseline")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="percent slowdown that counts as a regression (default 10)")
+    parser.add_argument('--list', action='store_true', help="list the workloads and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(workloads()))
+        return 0
+    try:
+        report = run_benchmarks(args.workloads or None, max(1, args.repeat))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    print('\n'.join(format_report(report)))
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(report, baseline, args.threshold)
+        print(f"\nCompared with {args.compare}:")
+        print('\n'.join(lines))
+        status = 1 if regressed else 0
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    return status
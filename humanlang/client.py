@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import socket
+import argparse
+import tempfile
+
+
+def default_socket():
+    """The socket 'humanlang serve' listens on unless told otherwise: one per user."""
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.environ.get('HUMANLANG_SOCKET') or os.path.join(directory, f"humanlang-{os.getuid()}.sock")
+
+
+def run(path, socket_path=None):
+    """
+    Asks a running 'humanlang serve' to run a script, printing its output as it
+    arrives. Returns the script's exit status. Only the standard library is
+    imported here, so a run costs a Python start and a round trip, nothing more.
+    """
+    socket_path = socket_path or default_socket()
+    request = {'script': os.path.abspath(path), 'cwd': os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f"No humanlang server is listening on {socket_path}. Start one with 'humanlang serve'.",
+                  file=sys.stderr)
+            return 2
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('r', encoding='utf-8') as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if 'stdout' in reply:
+                    sys.stdout.write(reply['stdout'])
+                elif 'exit' in reply:
+                    sys.stdout.flush()
+                    return reply['exit']
+    print("The humanlang server closed the connection before the script finished.", file=sys.stderr)
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='humanlang client',
+                                     description="Run a script on a running 'humanlang serve'.")
+    parser.add_argument('file', help="the .human script to run")
+    parser.add_argument('--socket', metavar='PATH', help=f"the server's socket (default: {default_socket()})")
+    args = parser.parse_args(argv)
+    return run(args.file, args.socket)
@@ -0,0 +1,244 @@
+import os
+import heapq
+import struct
+import ipaddress
+from array import array
+from collections import Counter, OrderedDict
+from .capture import PacketFile, BUFFER_SIZE
+
+try:
+    import numpy
+except ImportError:  # the stdlib arrays and Counter below do the same work, just more slowly
+    numpy = None
+
+PROTOCOLS = {1: 'icmp', 6: 'tcp', 17: 'udp', 58: 'icmpv6'}
+NON_IP = 255  # protocol number recorded for packets without an IP layer
+
+FIELDS = {
+    'src': 'src', 'source': 'src', 'source address': 'src',
+    'dst': 'dst', 'destination': 'dst', 'destination address': 'dst',
+    'sport': 'sport', 'source port': 'sport',
+    'dport': 'dport', 'port': 'dport', 'destination port': 'dport',
+    'protocol': 'proto', 'proto': 'proto',
+}
+
+_PCAP_MAGIC = {b'\xd4\xc3\xb2\xa1': '<', b'\x4d\x3c\xb2\xa1': '<',
+               b'\xa1\xb2\xc3\xd4': '>', b'\xa1\xb2\x3c\x4d': '>'}
+_ETHERNET, _NULL, _RAW, _LINUX_SLL, _IPV4, _IPV6 = 1, 0, 101, 113, 228, 229
+
+
+def field_name(name):
+    field = FIELDS.get(name.strip().lower())
+    if not field:
+        raise ValueError(f"Cannot group packets by '{name}'. Use one of: source, destination, source port, port, protocol.")
+    return field
+
+
+class PacketColumns:
+    """
+    The fields aggregation needs, one compact array per field: source and
+    destination (indexes into a table of raw addresses, 0 meaning none), source and
+    destination port (0 meaning none), protocol number and length on the wire.
+    Every aggregate is computed from these columns, never from the packets.
+    """
+    def __init__(self):
+        self.addresses = [None]
+        self._address_ids = {}
+        self.src = array('I')
+        self.dst = array('I')
+        self.sport = array('H')
+        self.dport = array('H')
+        self.proto = array('B')
+        self.length = array('I')
+
+    def __len__(self):
+        return len(self.length)
+
+    def address_id(self, raw):
+        ident = self._address_ids.get(raw)
+        if ident is None:
+            ident = self._address_ids[raw] = len(self.addresses)
+            self.addresses.append(raw)
+        return ident
+
+    def append(self, src, dst, sport, dport, proto, length):
+        self.src.append(src)
+        self.dst.append(dst)
+        self.sport.append(sport)
+        self.dport.append(dport)
+        self.proto.append(proto)
+        self.length.append(length)
+
+    def label(self, field, key):
+        if field in ('src', 'dst'):
+            return str(ipaddress.ip_address(self.addresses[key]))
+        if field == 'proto':
+            return PROTOCOLS.get(key, 'non-ip' if key == NON_IP else str(key))
+        return key
+
+    def group(self, field):
+        """Returns ({key: packets}, {key: bytes}) for one field, skipping packets that lack it."""
+        column = getattr(self, field)
+        if numpy is not None and len(column):
+            keys = numpy.frombuffer(column, dtype=column.typecode)
+            lengths = numpy.frombuffer(self.length, dtype=self.length.typecode)
+            if field != 'proto':
+                present = keys != 0
+                keys, lengths = keys[present], lengths[present]
+            unique, inverse, counts = numpy.unique(keys, return_inverse=True, return_counts=True)
+            sums = numpy.bincount(inverse, weights=lengths, minlength=len(unique))
+            return (dict(zip(unique.tolist(), counts.tolist())),
+                    dict(zip(unique.tolist(), sums.astype(numpy.int64).tolist())))
+        counts = Counter(column)
+        sums = dict.fromkeys(counts, 0)
+        for key, length in zip(column, self.length):
+            sums[key] += length
+        if field != 'proto':
+            counts.pop(0, None)
+            sums.pop(0, None)
+        return dict(counts), sums
+
+
+def _parse_frame(columns, data, linktype, length):
+    """Reads addresses, ports and protocol straight out of one raw frame."""
+    offset, version = 0, None
+    if linktype == _ETHERNET:
+        offset = 12
+        ethertype = int.from_bytes(data[12:14], 'big')
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 6:  # VLAN tags
+            offset += 4
+            ethertype = int.from_bytes(data[offset:offset + 2], 'big')
+        offset += 2
+        version = 4 if ethertype == 0x0800 else 6 if ethertype == 0x86DD else None
+    elif linktype == _LINUX_SLL:
+        ethertype = int.from_bytes(data[14:16], 'big')
+        offset = 16
+        version = 4 if ethertype == 0x0800 else 6 if ethertype == 0x86DD else None
+    elif linktype == _NULL:
+        offset = 4
+        version = data[4] >> 4 if len(data) > 4 else None
+    elif linktype in (_RAW, _IPV4, _IPV6):
+        version = data[0] >> 4 if data else None
+
+    if version == 4 and len(data) >= offset + 20:
+        header_len = (data[offset] & 0x0F) * 4
+        proto = data[offset + 9]
+        src = columns.address_id(bytes(data[offset + 12:offset + 16]))
+        dst = columns.address_id(bytes(data[offset + 16:offset + 20]))
+        fragment = int.from_bytes(data[offset + 6:offset + 8], 'big') & 0x1FFF
+        ports_at = offset + header_len if not fragment else None
+    elif version == 6 and len(data) >= offset + 40:
+        proto = data[offset + 6]
+        src = columns.address_id(bytes(data[offset + 8:offset + 24]))
+        dst = columns.address_id(bytes(data[offset + 24:offset + 40]))
+        ports_at = offset + 40
+    else:
+        columns.append(0, 0, 0, 0, NON_IP, length)
+        return
+    sport = dport = 0
+    if proto in (6, 17) and ports_at is not None and len(data) >= ports_at + 4:
+        sport, dport = struct.unpack_from('>HH', data, ports_at)
+    columns.append(src, dst, sport, dport, proto, length)
+
+
+def read_pcap_columns(path):
+    """
+    Builds columns from a classic pcap file by walking its records directly,
+    without dissecting packets. Returns None for files this can't read (pcapng).
+    """
+    with open(path, 'rb', buffering=BUFFER_SIZE) as f:
+        header = f.read(24)
+        endian = _PCAP_MAGIC.get(header[:4])
+        if endian is None or len(header) < 24:
+            return None
+        linktype = struct.unpack(endian + 'I', header[20:24])[0] & 0xFFFF
+        record = struct.Struct(endian + 'IIII')
+        columns = PacketColumns()
+        buffer, pos = b'', 0
+        while True:
+            if len(buffer) - pos < 16:
+                chunk = f.read(BUFFER_SIZE)
+                if not chunk:
+                    break
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            _, _, captured, original = record.unpack_from(buffer, pos)
+            end = pos + 16 + captured
+            if end > len(buffer):
+                chunk = f.read(max(BUFFER_SIZE, end - len(buffer)))
+                if not chunk:
+                    break  # truncated last record
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            _parse_frame(columns, memoryview(buffer)[pos + 16:end], linktype, original)
+            pos = end
+    return columns
+
+
+def packet_columns(packets):
+    """Builds columns from scapy packets, for lists and files the raw reader can't handle."""
+    from scapy.all import IP, IPv6, TCP, UDP
+    columns = PacketColumns()
+    for packet in packets:
+        length = getattr(packet, 'wirelen', None) or len(packet)
+        layer = packet.getlayer(IP) or packet.getlayer(IPv6)
+        if layer is None:
+            columns.append(0, 0, 0, 0, NON_IP, length)
+            continue
+        version = 4 if layer.version == 4 else 6
+        src = columns.address_id(ipaddress.ip_address(layer.src).packed)
+        dst = columns.address_id(ipaddress.ip_address(layer.dst).packed)
+        proto = layer.proto if version == 4 else layer.nh
+        transport = packet.getlayer(TCP) or packet.getlayer(UDP)
+        sport, dport = (transport.sport, transport.dport) if transport is not None else (0, 0)
+        columns.append(src, dst, sport, dport, proto, length)
+    return columns
+
+
+_file_columns = OrderedDict()
+
+
+def columns_for(packets):
+    """Columns for a packet list or PacketFile. A file is only read once while it is unchanged."""
+    if isinstance(packets, PacketColumns):
+        return packets
+    if not isinstance(packets, PacketFile):
+        if hasattr(packets, 'haslayer'):
+            packets = [packets]
+        return packet_columns(packets)
+    stat = os.stat(packets.path)
+    key = (os.path.abspath(packets.path), stat.st_mtime_ns, stat.st_size)
+    columns = _file_columns.get(key)
+    if columns is None:
+        columns = read_pcap_columns(packets.path) or packet_columns(packets)
+        _file_columns[key] = columns
+        while len(_file_columns) > 4:
+            _file_columns.popitem(last=False)
+    _file_columns.move_to_end(key)
+    return columns
+
+
+def count_by(packets, field):
+    """{value: packets} for a field, busiest first."""
+    columns = columns_for(packets)
+    field = field_name(field)
+    counts, _ = columns.group(field)
+    return {columns.label(field, key): n for key, n in sorted(counts.items(), key=lambda kv: -kv[1])}
+
+
+def bytes_by(packets, field):
+    """{value: bytes} for a field, largest first."""
+    columns = columns_for(packets)
+    field = field_name(field)
+    _, sums = columns.group(field)
+    return {columns.label(field, key): n for key, n in sorted(sums.items(), key=lambda kv: -kv[1])}
+
+
+def top(packets, field, n, measure='packets'):
+    """The n busiest values of a field, as objects holding the value, its packets and its bytes."""
+    columns = columns_for(packets)
+    name, field = field.strip().lower(), field_name(field)
+    counts, sums = columns.group(field)
+    ranking = counts if measure == 'packets' else sums
+    best = heapq.nlargest(int(n), ranking, key=ranking.__getitem__)
+    return [{name: columns.label(field, key), 'packets': counts[key], 'bytes': sums[key]} for key in best]
@@ -0,0 +1,139 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+CACHE_DIR = '__humancache__'
+# Bump whenever the pickled structures (instructions, scopes, definitions) change shape.
+FORMAT_VERSION = 6
+
+
+class CompiledProgram:
+    """Everything a warm start needs: the checked, resolved and compiled form of one file."""
+    __slots__ = ('interpreter', 'source', 'dependencies', 'summaries', 'imports', 'program', 'classes', 'tasks',
+                 'scope', 'types', 'summary', 'checked')
+
+    def __init__(self, source, dependencies, summaries, imports, program, classes, tasks, scope, types,
+                 summary, checked):
+        self.interpreter = interpreter_stamp()
+        self.source = source              # fingerprint of the file itself
+        self.dependencies = dependencies  # {library path: fingerprint}, transitive
+        self.summaries = summaries        # {library path: digest of its TypeSummary}, direct imports only
+        self.imports = imports            # library paths this file imports directly, in order
+        self.program = program
+        self.classes = classes
+        self.tasks = tasks
+        self.scope = scope
+        self.types = types
+        self.summary = summary            # the TypeSummary importers check against
+        self.checked = checked            # keys of the task bodies that passed the type checker
+
+
+_stamp = None
+
+
+def interpreter_stamp():
+    """
+    Identifies the interpreter code that compiled a program. Instructions point at
+    handlers by name and carry their decoded arguments, so a cache written by
+    different handler code must not be reused.
+    """
+    global _stamp
+    if _stamp is None:
+        core = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256(str(FORMAT_VERSION).encode())
+        for name in sorted(os.listdir(core)):
+            if name.endswith('.py'):
+                stat = os.stat(os.path.join(core, name))
+                digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        _stamp = digest.hexdigest()
+    return _stamp
+
+
+def fingerprint(path):
+    """Returns (mtime_ns, size, sha256) of a file."""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return (stat.st_mtime_ns, stat.st_size, digest)
+
+
+def is_current(path, known):
+    """True if the file still matches a stored fingerprint; only rehashes when mtime or size moved."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if (stat.st_mtime_ns, stat.st_size) == known[:2]:
+        return True
+    return fingerprint(path)[2] == known[2]
+
+
+class ProgramCache:
+    """
+    A persistent cache of compiled programs, kept in a __humancache__ directory
+    next to each source file. Set HUMANLANG_NOCACHE to disable it. A long-running
+    process can pass 'memory', a dict shared across runs, to keep the programs it
+    has loaded or compiled in memory too, keyed by path and checked against the
+    source's fingerprint like the files are.
+    """
+    def __init__(self, source_path, memory=None):
+        self.source_path = source_path
+        self.memory = memory
+        self.previous = None  # the last program loaded, if it turned out stale
+        directory, name = os.path.split(source_path)
+        self.cache_path = os.path.join(directory, CACHE_DIR, f"{name}.v{FORMAT_VERSION}.pickle")
+        self.enabled = not os.environ.get('HUMANLANG_NOCACHE')
+
+    def load(self):
+        """
+        Returns the cached CompiledProgram, or None if it is missing or was compiled
+        from an older version of the file (it is kept in 'previous' then). Whether
+        the libraries it imports still fit is for the interpreter to decide.
+        """
+        if not self.enabled:
+            return None
+        compiled = self.memory.get(self.source_path) if self.memory is not None else None
+        if compiled is None:
+            try:
+                with open(self.cache_path, 'rb') as f:
+                    compiled = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError):
+                return None
+        if not isinstance(compiled, CompiledProgram) or getattr(compiled, 'interpreter', None) != interpreter_stamp():
+            return None
+        if not is_current(self.source_path, compiled.source):
+            self.previous = compiled
+            return None
+        if self.memory is not None:
+            self.memory[self.source_path] = compiled
+        return compiled
+
+    def refresh(self, compiled):
+        """
+        Re-stores a program whose libraries changed without changing what it was
+        checked against, with their new fingerprints, so later starts skip the comparison.
+        """
+        dependencies = {path: known if is_current(path, known) else fingerprint(path)
+                        for path, known in compiled.dependencies.items() if os.path.exists(path)}
+        if dependencies != compiled.dependencies:
+            compiled.dependencies = dependencies
+            self.store(compiled)
+
+    def store(self, compiled):
+        """Writes the program atomically; an unwritable directory just means no cache."""
+        if not self.enabled:
+            return
+        if self.memory is not None:
+            self.memory[self.source_path] = compiled
+        directory = os.path.dirname(self.cache_path)
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
@@ -0,0 +1,129 @@
+import asyncio
+from scapy.all import AsyncSniffer, PcapReader, PcapWriter, PcapNgWriter
+
+_END = object()
+# Capture files are read and written through buffers this big, so memory stays flat for any file size.
+BUFFER_SIZE = 1 << 20
+
+
+class PacketFile:
+    """
+    A pcap or pcapng file read lazily: each pass with 'for each' streams packets
+    from disk through a fixed-size buffer, so even a multi-gigabyte capture never
+    has to fit in memory. It can be iterated any number of times.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, 'rb', buffering=BUFFER_SIZE) as f:
+            with PcapReader(f) as reader:
+                yield from reader
+
+    def __repr__(self):
+        return f"<packets from '{self.path}'>"
+
+
+def write_packets(path, packets):
+    """Writes packets (a list, a PacketFile or a single packet) to a capture file, returning the count."""
+    if hasattr(packets, 'haslayer'):
+        packets = [packets]
+    if str(path).lower().endswith('.pcapng'):
+        writer = PcapNgWriter(path)
+    else:
+        writer = PcapWriter(path, sync=False, bufsz=BUFFER_SIZE)
+    count = 0
+    with writer:
+        for packet in packets:
+            writer.write(packet)
+            count += 1
+    return count
+
+
+class PacketStream:
+    """
+    Streams packets from a live interface or a capture file to a handler as they
+    arrive, instead of buffering the whole capture. Packets pass through a bounded
+    queue: when the handler falls behind, the capture thread waits for room rather
+    than piling packets up in memory.
+
+    The capture stops at the first of: 'timeout' seconds, 'max_packets' packets,
+    'max_bytes' bytes, the end of the file, or an error in the handler.
+    """
+    def __init__(self, iface=None, offline=None, bpf_filter=None, timeout=None,
+                 max_packets=None, max_bytes=None, batch_size=None, queue_size=1000):
+        self.sniff_args = {'iface': iface} if offline is None else {'offline': offline}
+        if bpf_filter:
+            self.sniff_args['filter'] = bpf_filter
+        if timeout:
+            self.sniff_args['timeout'] = timeout
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.packets = 0
+        self.bytes = 0
+        self.stopped = False
+
+    async def run(self, handler):
+        """
+        Awaits handler(packet) for every packet, or handler(list of packets) for
+        every batch when a batch size is set.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.queue_size)
+
+        def on_packet(packet):  # runs on the capture thread
+            if self.stopped:
+                return
+            size = len(packet)
+            if self.max_bytes and self.bytes + size > self.max_bytes:
+                self.stopped = True
+                return
+            self.packets += 1
+            self.bytes += size
+            if self.max_packets and self.packets >= self.max_packets:
+                self.stopped = True
+            asyncio.run_coroutine_threadsafe(queue.put(packet), loop).result()
+
+        sniffer = AsyncSniffer(prn=on_packet, store=False, stop_filter=lambda packet: self.stopped,
+                               **self.sniff_args)
+        sniffer.start()
+
+        async def finish():
+            try:
+                await asyncio.to_thread(sniffer.join)
+            finally:
+                await queue.put(_END)
+        finisher = asyncio.create_task(finish())
+
+        try:
+            batch = []
+            while True:
+                packet = await queue.get()
+                if packet is _END:
+                    break
+                if not self.batch_size:
+                    await handler(packet)
+                    continue
+                batch.append(packet)
+                if len(batch) >= self.batch_size:
+                    await handler(batch)
+                    batch = []
+            if batch:
+                await handler(batch)
+        except BaseException:
+            self.stop(sniffer)
+            # Keep draining so a capture thread blocked on a full queue can see the stop.
+            while await queue.get() is not _END:
+                pass
+            await asyncio.gather(finisher, return_exceptions=True)
+            raise
+        await finisher  # surfaces capture errors such as missing privileges
+
+    def stop(self, sniffer):
+        self.stopped = True
+        try:
+            sniffer.stop(join=False)
+        except Exception:
+            pass  # already finished, or a capture file that ends on its own
@@ -1,304 +1,595 @@
 import re
 import json
+import operator
 import sys
 import asyncio
-import aiohttp
 from scapy.all import srp, Ether, ARP, sr1, IP, TCP, ICMP, sr, traceroute, sniff
-from .structures import Environment, ObjectInstance, ReturnValue
+from .structures import Environment, ObjectInstance, ReturnValue, StringBuilder, Instruction
+from .parser import locate
+from .expressions import compile_expression, bind_expression, get_property
+from .scanner import PortScanner, expand_hosts, probe_hosts
+from .capture import PacketStream, PacketFile, write_packets
+from . import aggregate
+from .scheduler import TaskGroup, current_group, wait_all
+
+# Statement prefixes in the order they are tried. Each lists the patterns the
+# statement can take, the handler for each, which captures are expressions and,
+# optionally, which are a call's argument list (both compiled ahead of time); a
+# line that starts with the prefix but fits none of them compiles to an
+# instruction raising the message.
+_COMMANDS = [
+    ("set ", [(r'set (?:item|key) (?!to\b)(.+?) of (.+?) to (.+)', 'handle_set_item', (0, 1, 2)),
+              (r"set (.+)'s (\w+) to (.*?)(?:\s*#.*)?$", 'handle_set_property', (2,)),
+              (r'set (\w+) to (.+)', 'handle_set_variable', (1,))], "Invalid 'set' command: {line}"),
+    ("create a new ", [(r'create a new "Packet" with layers "(.+)" and call it (\w+)', 'handle_create_packet', ()),
+                       (r'create a new "StringBuilder" and call it (\w+)', 'handle_create_builder', ()),
+                       (r'create a new "([^"]+)"(?: with (.+))? and call it (\w+)', 'handle_create_instance', (), (1,))],
+     "Invalid 'create a new' command: {line}"),
+    ("add ", [(r"(add) (.+) to ((.+)'s (\w+))$", 'handle_math_property', (1, 2)),
+              (r'(add) (.+) to (.+)', 'handle_math', (1, 2))], "Invalid math operation: {line}"),
+    ("subtract ", [(r"(subtract) (.+) from ((.+)'s (\w+))$", 'handle_math_property', (1, 2)),
+                   (r'(subtract) (.+) from (.+)', 'handle_math', (1, 2))], "Invalid math operation: {line}"),
+    ("multiply ", [(r"(multiply) ((.+)'s (\w+)) by (.+)", 'handle_math_property', (1, 4)),
+                   (r'(multiply) (.+) by (.+)', 'handle_math', (1, 2))], "Invalid math operation: {line}"),
+    ("divide ", [(r"(divide) ((.+)'s (\w+)) by (.+)", 'handle_math_property', (1, 4)),
+                 (r'(divide) (.+) by (.+)', 'handle_math', (1, 2))], "Invalid math operation: {line}"),
+    ("ask ", [(r'ask "(.+)" and set the answer to (\w+)', 'handle_input', ())], "Invalid 'ask' command: {line}"),
+    ("perform an arp scan on", [(r'perform an arp scan on (.+?) and store the results in (\w+)', 'handle_arp_scan', (0,))],
+     "Invalid ARP scan command."),
+    ("perform a port scan on", [(r'perform a port scan on (.+?) for ports (.+?)(?: at (.+?) packets per second)?'
+                                 r'( in the background)? and store the results in (\w+)', 'handle_port_scan', (0, 1, 2))],
+     "Invalid port scan command."),
+    ("perform a ping to", [(r'perform a ping to (.+?) and store the result in (\w+)', 'handle_ping', (0,))],
+     "Invalid ping command syntax."),
+    ("perform a traceroute to", [(r'perform a traceroute to (.+?) and store the result in (\w+)', 'handle_traceroute', (0,))],
+     "Invalid traceroute command syntax."),
+    ("send packet", [(r'send packet (.+?) and store the reply in (\w+)', 'handle_send_packet', (0,))],
+     "Invalid send packet command."),
+    ("start sniffing", [(r'start sniffing (?:on interface (.+?)|the file (.+?))(?: with filter "(.*?)")?(?: for (\d+) seconds)?'
+                         r'(?: up to (\d+) packets)?(?: up to (\d+) bytes)? and perform "([^"]+)" for each'
+                         r' (?:packet|batch of (\d+) packets)$', 'handle_stream_sniff', (0, 1)),
+                        (r'start sniffing on interface (.+?) with filter "(.+?)" for (\d+) seconds and store packets in (\w+)', 'handle_sniff', (0,))],
+     "Invalid sniff command."),
+    ("perform ", [(r'perform an http get request to each of (.+?) and store the results in (\w+)', 'handle_http_get_all', (0,)),
+                  (r'perform an http get request to (.+?) and store the result in (\w+)', 'handle_http_get', (0,)),
+                  (r'perform "([^"]+)"(?: with (.+))? asynchronously', 'handle_perform_async', (), (1,)),
+                  (r'perform "([^"]+)" in parallel for each \w+ in (.+?)(?: and store the results in (\w+))?$',
+                   'handle_perform_parallel', (1,)),
+                  (r"perform (\w+)'s task named \"([^\"]+)\"(?: with (.+?))?(?: and store the result in (\w+))?$",
+                   'handle_perform_method', (), (2,)),
+                  (r'perform "([^"]+)"(?: with (.+?))?(?: and store the result in (\w+))?$', 'handle_perform_task', (), (1,))],
+     "Invalid 'perform' command: {line}"),
+    ("await all tasks", [(r'await all tasks(?: for up to (.+?) seconds)?$', 'handle_await_all', (0,))],
+     "Invalid 'await' command: {line}"),
+    ("get the task statistics", [(r'get the task statistics and store them in (\w+)', 'handle_task_stats', ())],
+     "Invalid task statistics command: {line}"),
+    ("parse the json string", [(r'parse the json string (.+?) and store the result in (\w+)', 'handle_parse_json', (0,))],
+     "Invalid JSON parse command: {line}"),
+    ("return ", [(r'return (.+)', 'handle_return', (0,))], "Invalid 'return' command: {line}"),
+    ("show me ", [(r'show me\s+(.+)', 'handle_print', (0,))], "Invalid 'show me' command: {line}"),
+    ("print ", [(r'print\s+(.+)', 'handle_print', (0,))], "Invalid 'print' command: {line}"),
+    ("display ", [(r'display\s+(.+)', 'handle_print', (0,))], "Invalid 'display' command: {line}"),
+    ("write ", [(r'write the packets (.+) to the pcap file (.+)', 'handle_pcap_write', (0, 1)),
+                (r'write (.+) to the file (.+)', 'handle_file_write', (0, 1))], "Invalid file write syntax: {line}"),
+    ("count the packets", [(r'count the packets in (.+?) by (.+?) and store the result in (\w+)', 'handle_count_packets', (0,))],
+     "Invalid packet count syntax: {line}"),
+    ("sum the bytes", [(r'sum the bytes in (.+?) by (.+?) and store the result in (\w+)', 'handle_sum_bytes', (0,))],
+     "Invalid byte sum syntax: {line}"),
+    ("find the top", [(r'find the top (.+?) (source address|destination address|source port|destination port|source|'
+                       r'destination|port|protocol|src|dst|sport|dport|proto) in (.+?) by (packets|bytes)'
+                       r' and store the result in (\w+)', 'handle_top_packets', (0, 2))],
+     "Invalid top syntax: {line}"),
+    ("read the packets", [(r'read the packets from the file (.+?) and store them in (\w+)', 'handle_pcap_read', (0,))],
+     "Invalid packet file read syntax: {line}"),
+    ("read the file", [(r'read the file "([^"]+)" and store the contents in (\w+)', 'handle_file_read', ())],
+     "Invalid file read syntax: {line}"),
+    ("append ", [(r'append (.+) to the file (.+)', 'handle_file_append', (0, 1)),
+                 (r'append (.+) to (\w+)$', 'handle_append', (0,))], "Invalid 'append' command: {line}"),
+    ("get item ", [(r'get item (.+?) of (.+?) and store (?:it|the result) in (\w+)$', 'handle_get_item', (0, 1))],
+     "Invalid 'get item' command: {line}"),
+    ("remove ", [(r'remove item (.+?) from (.+)', 'handle_remove_item', (0, 1)),
+                 (r'remove (.+) from (.+)', 'handle_remove', (0, 1))], "Invalid 'remove' command: {line}"),
+    ("sort ", [(r'sort (.+?)(?: by (\w+))?( in descending order)?$', 'handle_sort', (0,))],
+     "Invalid 'sort' command: {line}"),
+    ("flush the file", [(r'flush the file (.+)', 'handle_file_flush', (0,))], "Invalid file flush syntax: {line}"),
+    ("close the file", [(r'close the file (.+)', 'handle_file_close', (0,))], "Invalid file close syntax: {line}"),
+]
+_COMMANDS = [(prefix, [(re.compile(pattern, re.I), handler, exprs, arg_lists[0] if arg_lists else ())
+                       for pattern, handler, exprs, *arg_lists in patterns], error)
+             for prefix, patterns, error in _COMMANDS]
+# Splits a call's arguments on the commas that are not inside quotes.
+_ARG_SPLIT_RE = re.compile(r',\s*(?=(?:[^"]*"[^"]*")*[^"]*$)')
+
+_MATH_OPS = {'add': operator.add, 'subtract': operator.sub, 'multiply': operator.mul, 'divide': operator.truediv}
+
+_TASK_GROUP_RE = re.compile(r'run a task group(?: with at most (.+?) at a time)?(?: for up to (.+?) seconds)?'
+                            r'(?: and store the results in (\w+))?$', re.I)
+_IF_RE = re.compile(r'if (.+) then', re.I)
+_WHILE_RE = re.compile(r'while (.+?)(?: is true)?$', re.I)
+_FOR_RE = re.compile(r'for each (\w+) in (\w+)', re.I)
+_FOR_FILE_RE = re.compile(r'for each (\w+) in the file (.+)$', re.I)
 
 class Executor:
     def __init__(self, interpreter):
         self.interpreter = interpreter
-
-    async def execute(self, blocks, env):
-        # This allows the handle_try function to correctly manage errors
+        self.scanner = PortScanner()
+        self.host_workers = 32  # hosts pinged or traced at once
+        self.capture_queue_size = 1000  # packets buffered for a streaming sniff handler
+
+    def compile_program(self, blocks):
+        """
+        Compiles the top level, plus every task and method body not compiled yet.
+        A compiled task drops its parsed body; its instructions keep the Statements.
+        """
+        for task_def, _ in self.interpreter.task_definitions():
+            if 'code' not in task_def:
+                task_def['code'] = self.compile(task_def.pop('body'))
+        return self.compile(blocks)
+
+    def compile(self, blocks):
+        """Decodes each statement once into an Instruction, so loops never re-parse text."""
+        code = []
         for stmt in blocks:
+            ins = self.compile_block(stmt) if isinstance(stmt, list) else self.compile_line(stmt)
+            if ins:
+                code.append(ins)
+        return code
+
+    def compile_line(self, stmt):
+        line = stmt.text
+        lowered = line.lower()
+        # Declarations only matter to the type checker, and imports run before execution.
+        if not line or line.startswith('#') or lowered.startswith(('declare', 'use the library')):
+            return None
+        for prefix, patterns, error in _COMMANDS:
+            if lowered.startswith(prefix):
+                for pattern, handler, exprs, arg_lists in patterns:
+                    match = pattern.match(line)
+                    if match:
+                        return Instruction(getattr(Executor, handler), self._capture(match, exprs, arg_lists), stmt)
+                return self._invalid(SyntaxError, error.format(line=line), stmt)
+        return self._invalid(ValueError, f"I don't understand the command: '{line}'", stmt)
+
+    def compile_block(self, block):
+        stmt = block[0]
+        head = stmt.text
+        lowered = head.lower()
+        body = block[1:]
+        if lowered.startswith('try to'):
+            split = self._split_body(body, ('on error',))
+            if split is None:
+                return self._invalid(SyntaxError, "A 'Try to' block must have a matching 'On error' part.", stmt)
+            try_body, error_body = split
+            return Instruction(Executor.handle_try, (), stmt, self.compile(try_body),
+                               self.compile(error_body), block.scope)
+        if lowered.startswith('if'):
+            match = _IF_RE.match(head)
+            if not match:
+                return self._invalid(SyntaxError, f"Invalid 'if' statement: {head}", stmt)
+            if_body, else_body = self._split_body(body, ('else', 'otherwise')) or (body, [])
+            return Instruction(Executor.handle_if, self._capture(match, (0,)), stmt, self.compile(if_body),
+                               self.compile(else_body))
+        if lowered.startswith('for each'):
+            match = _FOR_FILE_RE.match(head)
+            if match:
+                return Instruction(Executor.handle_for_file, self._capture(match, (1,)), stmt, self.compile(body),
+                                   scope=block.scope)
+            match = _FOR_RE.match(head)
+            if not match:
+                return self._invalid(SyntaxError, f"Invalid for loop syntax: '{head}'", stmt)
+            return Instruction(Executor.handle_for, match.groups(), stmt, self.compile(body),
+                               scope=block.scope)
+        if lowered.startswith('while'):
+            match = _WHILE_RE.match(head)
+            if not match:
+                return self._invalid(SyntaxError, f"Invalid while loop syntax: '{head}'", stmt)
+            return Instruction(Executor.handle_while, self._capture(match, (0,)), stmt, self.compile(body))
+        if lowered.startswith('run a task group'):
+            match = _TASK_GROUP_RE.match(head)
+            if not match:
+                return self._invalid(SyntaxError, f"Invalid task group syntax: '{head}'", stmt)
+            return Instruction(Executor.handle_task_group, self._capture(match, (0, 1)), stmt, self.compile(body))
+        # Class and task definitions were collected before execution.
+        return None
+
+    def _capture(self, match, exprs, arg_lists=()):
+        args = list(match.groups())
+        for i, arg in enumerate(args):
+            if i in arg_lists:
+                args[i] = tuple(compile_expression(a.strip()) for a in _ARG_SPLIT_RE.split(arg)) if arg else ()
+            elif arg is None:
+                continue
+            elif i in exprs:
+                args[i] = compile_expression(arg)
+            elif arg.isidentifier():
+                args[i] = sys.intern(arg)  # variable names repeat across a program; keep one copy of each
+        return tuple(args)
+
+    def _split_body(self, body, separators):
+        for i, stmt in enumerate(body):
+            if not isinstance(stmt, list) and stmt.text.lower() in separators:
+                return body[:i], body[i + 1:]
+        return None
+
+    def _invalid(self, error_type, message, stmt):
+        return Instruction(Executor.handle_invalid, (error_type, message), stmt)
+
+    async def execute(self, code, env):
+        """
+        Runs instructions in order. A handler returns None, or the ReturnValue of a
+        'return' it ran into, which ends this block and is handed to the caller.
+        """
+        for ins in code:
             try:
-                if isinstance(stmt, list):
-                    head = stmt[0].lower().strip()
-                    if head.startswith('try to'):
-                        await self.handle_try(stmt, env)
-                    elif not head.startswith(('define a class', 'define a task')):
-                        await self.eval_block(stmt, env)
-                elif isinstance(stmt, str) and not stmt.lower().startswith('use the library'):
-                    await self.eval_line(stmt, env)
-            except ReturnValue:
-                raise
-
-    async def eval_block(self, block, env):
-        head = block[0].lower().strip()
-        if head.startswith('if'):
-            await self.handle_if(block, env)
-        elif head.startswith('for each'):
-            await self.handle_for(block, env)
-        elif head.startswith('while'):
-            await self.handle_while(block, env)
-
-    async def eval_line(self, line, env):
-        line = line.strip()
-        if not line or line.startswith('#'):
-            return
-
-        commands = {
-            "declare": self.handle_declare, "set ": self.handle_set,
-            "create a new ": self.handle_create_instance, "add ": self.handle_math,
-            "subtract ": self.handle_math, "multiply ": self.handle_math,
-            "divide ": self.handle_math, "ask ": self.handle_input,
-            "perform an arp scan on": self.handle_arp_scan,
-            "perform a port scan on": self.handle_port_scan,
-            "perform a ping to": self.handle_ping,
-            "perform a traceroute to": self.handle_traceroute,
-            "send packet": self.handle_send_packet,
-            "start sniffing": self.handle_sniff,
-            "perform ": self.handle_perform, "await all tasks": self.handle_await_all,
-            "parse the json string": self.handle_parse_json, "return ": self.handle_return,
-            "show me ": self.handle_print, "print ": self.handle_print,
-            "display ": self.handle_print, "write ": self.handle_file_write,
-            "read the file": self.handle_file_read
-        }
-
-        for cmd, handler in commands.items():
-            if line.lower().startswith(cmd):
-                if asyncio.iscoroutinefunction(handler):
-                    if cmd in ["add ", "subtract", "multiply ", "divide "]:
-                        await handler(line, cmd.strip(), env)
-                    else:
-                        await handler(line, env)
+                if ins.is_async:
+                    returned = await ins.op(self, ins, env)
                 else:
-                    handler(line, env)
-                return
-        raise ValueError(f"I don't understand the command: '{line}'")
-
-    def handle_declare(self, line, env):
-        pass
-
-    def handle_input(self, line, env):
-        match = re.match(r'ask "(.+)" and set the answer to (\w+)', line, re.I)
-        if match:
-            prompt, var_name = match.groups()
-            env.set(var_name, input(prompt + " "))
-
-    def handle_file_read(self, line, env):
-        match = re.match(r'read the file "([^"]+)" and store the contents in (\w+)', line, re.I)
-        filepath, var_name = match.groups()
-        with open(filepath, 'r') as f:
+                    returned = ins.op(self, ins, env)
+            except Exception as e:
+                raise locate(e, ins.source)
+            if returned is not None:
+                return returned
+
+    def handle_invalid(self, ins, env):
+        error_type, message = ins.args
+        raise error_type(message)
+
+    def handle_input(self, ins, env):
+        prompt, var_name = ins.args
+        env.set(var_name, input(prompt + " "))
+
+    def handle_file_read(self, ins, env):
+        filepath, var_name = ins.args
+        with self.interpreter.files.read(filepath) as f:
             env.set(var_name, f.read())
 
-    async def handle_try(self, block, env):
-        body = block[1:]
-        on_error_index = -1
-
-        # Correctly find the index by iterating through the original 'body' list
-        for i, stmt in enumerate(body):
-            if isinstance(stmt, str) and stmt.strip().lower() == 'on error':
-                on_error_index = i
-                break
-
-        # If 'on error' was not found, raise an error
-        if on_error_index == -1:
-            raise SyntaxError("A 'Try to' block must have a matching 'On error' part.")
-
-        # Slice the body correctly using the proper index
-        try_body = body[:on_error_index]
-        error_body = body[on_error_index + 1:]
-
+    async def handle_try(self, ins, env):
         try:
-            await self.execute(try_body, env)
+            return await self.execute(ins.body, env)
         except Exception as e:
-            error_env = Environment(outer=env)
+            error_env = Environment(outer=env, scope=ins.scope)
             error_env.set("error_message", str(e), "String")
-            await self.execute(error_body, error_env)
+            return await self.execute(ins.orelse, error_env)
 
-    async def handle_set(self, line, env):
-        packet_prop_match = re.match(r"set (.+)'s (\w+) to (.+)", line, re.I)
-        var_match = re.match(r'set (\w+) to (.+)', line, re.I)
+    async def handle_set_property(self, ins, env):
+        obj_name, prop, expr = ins.args
+        value = await self.interpreter.eval_expr(expr, env)
+        self.assign_property(obj_name, prop, value, env)
 
-        if packet_prop_match:
-            obj_name, prop, expr = packet_prop_match.groups()
-            instance = env.get(obj_name)
-            
-            clean_expr_match = re.match(r"(.*?)(?:\s*#.*)?$", expr)
-            clean_expr = clean_expr_match.group(1).strip()
-            
-            value = await self.interpreter.eval_expr(clean_expr, env)
-            
-            if hasattr(instance, 'haslayer') and hasattr(instance, 'getlayer'):
-                if prop in ['dport', 'sport', 'flags', 'seq', 'ack'] and instance.haslayer(TCP):
-                    setattr(instance.getlayer(TCP), prop, value)
-                elif prop in ['dst', 'src', 'ttl', 'id'] and instance.haslayer(IP):
-                    setattr(instance.getlayer(IP), prop, value)
-                elif prop in ['dst', 'src'] and instance.haslayer(Ether):
-                    setattr(instance.getlayer(Ether), prop, value)
-                else:
-                    setattr(instance, prop, value)
-            elif isinstance(instance, ObjectInstance):
-                 instance.env.set(prop, value)
+    async def handle_set_variable(self, ins, env):
+        var, expr = ins.args
+        value = await self.interpreter.eval_expr(expr, env)
+        self.assign_variable(var, value, env)
+
+    def assign_variable(self, var, value, env):
+        # If it doesn't exist, set it in the current scope.
+        if not env.update(var, value):
+            env.set(var, value)
+
+    def assign_property(self, obj_name, prop, value, env):
+        instance = env.get(obj_name)
+        if hasattr(instance, 'haslayer') and hasattr(instance, 'getlayer'):
+            if prop in ['dport', 'sport', 'flags', 'seq', 'ack'] and instance.haslayer(TCP):
+                setattr(instance.getlayer(TCP), prop, value)
+            elif prop in ['dst', 'src', 'ttl', 'id'] and instance.haslayer(IP):
+                setattr(instance.getlayer(IP), prop, value)
+            elif prop in ['dst', 'src'] and instance.haslayer(Ether):
+                setattr(instance.getlayer(Ether), prop, value)
             else:
-                env.set(obj_name, value)
-
-        elif var_match:
-            var, expr = var_match.groups()
-            value = await self.interpreter.eval_expr(expr.strip(), env)
-            # If it doesn't exist, set it in the current scope.
-            if not env.update(var, value):
-                env.set(var, value)
+                setattr(instance, prop, value)
+        elif isinstance(instance, ObjectInstance):
+            instance.set(prop, value)
         else:
-            raise SyntaxError(f"Invalid 'set' command: {line}")
-
-    async def handle_create_instance(self, line, env):
-        packet_match = re.match(r'create a new "Packet" with layers "(.+)" and call it (\w+)', line, re.I)
-        class_match = re.match(r'create a new "([^"]+)"(?: with (.+))? and call it (\w+)', line, re.I)
+            env.set(obj_name, value)
 
-        if packet_match:
-            layers_str, var_name = packet_match.groups()
-            layers = [l.strip().upper() for l in layers_str.split('/')]
-            
-            packet_structure = None
-            layer_map = {"ETHER": Ether, "IP": IP, "TCP": TCP, "ICMP": ICMP, "ARP": ARP}
-            for layer_name in layers:
-                if layer_name not in layer_map:
-                    raise ValueError(f"Unknown packet layer: {layer_name}")
-                if packet_structure is None:
-                    packet_structure = layer_map[layer_name]()
-                else:
-                    packet_structure /= layer_map[layer_name]()
-            
-            env.set(var_name, packet_structure)
-
-        elif class_match:
-            class_name, args_str, var_name = class_match.groups()
-            class_def = self.interpreter.classes.get(class_name)
-            instance = ObjectInstance(class_def)
-            env.set(var_name, instance, class_name)
-            if class_def.find_method("initializer"):
-                await self.interpreter._call_method(instance, "initializer", args_str, env)
-        else:
-            raise SyntaxError(f"Invalid 'create a new' command: {line}")
-
-    async def handle_if(self, block, env):
-        condition_str = re.match(r'if (.+) then', block[0], re.I).group(1)
-        body = block[1:]
+    def handle_create_packet(self, ins, env):
+        layers_str, var_name = ins.args
+        layers = [l.strip().upper() for l in layers_str.split('/')]
+        
+        packet_structure = None
+        layer_map = {"ETHER": Ether, "IP": IP, "TCP": TCP, "ICMP": ICMP, "ARP": ARP}
+        for layer_name in layers:
+            if layer_name not in layer_map:
+                raise ValueError(f"Unknown packet layer: {layer_name}")
+            if packet_structure is None:
+                packet_structure = layer_map[layer_name]()
+            else:
+                packet_structure /= layer_map[layer_name]()
+        
+        env.set(var_name, packet_structure)
+
+    def handle_create_builder(self, ins, env):
+        var_name, = ins.args
+        env.set(var_name, StringBuilder(), "StringBuilder")
+
+    async def handle_append(self, ins, env):
+        expr, var_name = ins.args
+        target = env.get(var_name)
+        if not isinstance(target, (list, StringBuilder)):
+            raise TypeError(f"Cannot append to '{var_name}': it is not a list or a StringBuilder.")
+        target.append(await self.interpreter.eval_expr(expr, env))
+
+    async def _collection(self, expr, env, types, action):
+        collection = await self.interpreter.eval_expr(expr, env)
+        if not isinstance(collection, types):
+            kinds = ' or an object' if dict in types else ''
+            raise TypeError(f"Cannot {action} '{expr.source}': it is not a list{kinds}.")
+        return collection
+
+    async def handle_get_item(self, ins, env):
+        key_expr, target_expr, var_name = ins.args
+        key = await self.interpreter.eval_expr(key_expr, env)
+        collection = await self._collection(target_expr, env, (list, dict), 'get an item of')
+        if isinstance(collection, dict):
+            env.set(var_name, collection.get(key))
+            return
+        try:
+            env.set(var_name, collection[key])
+        except IndexError:
+            raise IndexError(f"There is no item {key} in '{target_expr.source}', which has {len(collection)} items.")
+
+    async def handle_set_item(self, ins, env):
+        key_expr, target_expr, value_expr = ins.args
+        key = await self.interpreter.eval_expr(key_expr, env)
+        collection = await self._collection(target_expr, env, (list, dict), 'set an item of')
+        value = await self.interpreter.eval_expr(value_expr, env)
+        try:
+            collection[key] = value
+        except IndexError:
+            raise IndexError(f"There is no item {key} in '{target_expr.source}', which has {len(collection)} items.")
+
+    async def handle_remove_item(self, ins, env):
+        key_expr, target_expr = ins.args
+        key = await self.interpreter.eval_expr(key_expr, env)
+        collection = await self._collection(target_expr, env, (list, dict), 'remove an item from')
+        try:
+            del collection[key]
+        except (IndexError, KeyError):
+            raise IndexError(f"There is no item {key} in '{target_expr.source}'.")
+
+    async def handle_remove(self, ins, env):
+        value_expr, target_expr = ins.args
+        value = await self.interpreter.eval_expr(value_expr, env)
+        collection = await self._collection(target_expr, env, (list, dict), 'remove from')
         try:
-            else_index = [s.strip().lower() for s in body if isinstance(s, str)].index('else')
-            if_body, else_body = body[:else_index], body[else_index + 1:]
-        except ValueError:
-            if_body, else_body = body, None
+            if isinstance(collection, dict):
+                del collection[value]  # an object's entries are removed by key
+            else:
+                collection.remove(value)
+        except (ValueError, KeyError):
+            raise ValueError(f"{value!r} is not in '{target_expr.source}'.")
+
+    async def handle_sort(self, ins, env):
+        target_expr, field, descending = ins.args
+        collection = await self._collection(target_expr, env, (list,), 'sort')
+        key = (lambda item: get_property(item, field)) if field else None
+        collection.sort(key=key, reverse=bool(descending))
+
+    async def handle_create_instance(self, ins, env):
+        class_name, args, var_name = ins.args
+        class_def = self.interpreter.classes.get(class_name)
+        instance = ObjectInstance(class_def)
+        env.set(var_name, instance, class_name)
+        if class_def.find_method("initializer"):
+            await self.interpreter._call_method(instance, "initializer", args, env)
+
+    async def handle_if(self, ins, env):
+        condition_str, = ins.args
         if await self.interpreter.eval_expr(condition_str, env):
-            await self.execute(if_body, env)
-        elif else_body:
-            await self.execute(else_body, env)
+            return await self.execute(ins.body, env)
+        elif ins.orelse:
+            return await self.execute(ins.orelse, env)
 
-    async def handle_while(self, block, env):
-        condition_str = re.match(r'while (.+) is true', block[0], re.I).group(1)
-        body = block[1:]
+    async def handle_while(self, ins, env):
+        condition_str, = ins.args
         while await self.interpreter.eval_expr(condition_str, env):
-            await self.execute(body, env)
+            returned = await self.execute(ins.body, env)
+            if returned is not None:
+                return returned
 
-    async def handle_for(self, block, env):
-        match = re.match(r'for each (\w+) in (\w+)', block[0], re.I)
-        item_var, list_var_name = match.groups()
+    async def handle_for(self, ins, env):
+        item_var, list_var_name = ins.args
         the_list = env.get(list_var_name)
-        if not isinstance(the_list, list): raise TypeError(f"'{list_var_name}' is not a list.")
-        body = block[1:]
+        if not isinstance(the_list, (list, PacketFile)): raise TypeError(f"'{list_var_name}' is not a list.")
         for item in the_list:
-            loop_env = Environment(outer=env)
+            loop_env = Environment(outer=env, scope=ins.scope)
             loop_env.set(item_var, item)
-            await self.execute(body, loop_env)
-
-    async def handle_perform(self, line, env):
-        http_match = re.match(r'perform an http get request to (.+?) and store the result in (\w+)', line, re.I)
-        async_match = re.match(r'perform "([^"]+)"(?: with (.+))? asynchronously', line, re.I)
-        method_match = re.match(r"perform (\w+)'s task named \"([^\"]+)\"(?: with (.+))?(?: and store the result in (\w+))?", line, re.I)
-        task_match = re.match(r'perform "([^"]+)"(?: with (.+))?(?: and store the result in (\w+))?', line, re.I)
-        
-        if http_match:
-            url_expr, var_name = http_match.groups()
-            url = await self.interpreter.eval_expr(url_expr, env)
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if not response.ok: raise IOError(f"HTTP request failed with status {response.status}")
-                    result = await response.text()
-                    env.set(var_name, result, "String")
-        elif async_match:
-            task_name, args_str = async_match.groups()
-            task_def = self.interpreter.global_tasks.get(task_name)
-            if not task_def or not task_def.get('is_async'):
-                raise TypeError(f"Task '{task_name}' is not defined as an asynchronous task.")
-            coro = self.interpreter._call_task_or_method(task_def, args_str, env, None)
-            task = asyncio.create_task(coro)
-            if not env.get("running_tasks"): env.set("running_tasks", [])
-            env.get("running_tasks").append(task)
-        elif method_match:
-            obj_name, method_name, args_str, result_var = method_match.groups()
-            instance = env.get(obj_name)
-            result = await self.interpreter._call_method(instance, method_name, args_str, env)
-            if result_var: env.set(result_var, result)
-        elif task_match:
-            task_name, args_str, result_var = task_match.groups()
-            task = self.interpreter.global_tasks.get(task_name)
-            if not task: raise NameError(f"Global task '{task_name}' is not defined.")
-            result = await self.interpreter._call_task_or_method(task, args_str, self.interpreter.global_env, self.interpreter.global_env)
-            if result_var: env.set(result_var, result)
-
-    async def handle_await_all(self, line, env):
+            returned = await self.execute(ins.body, loop_env)
+            if returned is not None:
+                return returned
+
+    async def handle_for_file(self, ins, env):
+        item_var, path_expr = ins.args
+        path = await self.interpreter.eval_expr(path_expr, env)
+        # One line in memory at a time, however big the file is.
+        with self.interpreter.files.read(path) as f:
+            for line in f:
+                loop_env = Environment(outer=env, scope=ins.scope)
+                loop_env.set(item_var, line.rstrip('\r\n'), "String")
+                returned = await self.execute(ins.body, loop_env)
+                if returned is not None:
+                    return returned
+
+    async def handle_http_get(self, ins, env):
+        url_expr, var_name = ins.args
+        url = await self.interpreter.eval_expr(url_expr, env)
+        env.set(var_name, await self.interpreter.http.get_text(url), "String")
+
+    async def handle_http_get_all(self, ins, env):
+        urls_expr, var_name = ins.args
+        urls = await self.interpreter.eval_expr(urls_expr, env)
+        if not isinstance(urls, (list, tuple)): raise TypeError("An http get request to each of a value needs a list of URLs.")
+        env.set(var_name, await self.interpreter.http.get_all(urls), "List of String")
+
+    async def handle_perform_async(self, ins, env):
+        task_name, args = ins.args
+        task_def = self.interpreter.global_tasks.get(task_name)
+        if not task_def or not task_def.get('is_async'):
+            raise TypeError(f"Task '{task_name}' is not defined as an asynchronous task.")
+        # Arguments are evaluated now, not whenever the task gets a slot to run.
+        args = self.interpreter.eval_args(task_def, args, env)
+        self.start_background(self.interpreter.call_task(task_def, args), env)
+
+    def start_background(self, coro, env):
+        """Starts a coroutine in the enclosing task group, or else tracks it for 'await all tasks'."""
+        group = current_group()
+        if group:
+            return group.spawn(coro)
+        task = self.interpreter.scheduler.spawn(coro)
+        if not env.get("running_tasks"): env.set("running_tasks", [])
+        env.get("running_tasks").append(task)
+        return task
+
+    async def handle_perform_parallel(self, ins, env):
+        task_name, items_expr, result_var = ins.args
+        task_def = self.interpreter.global_tasks.get(task_name)
+        if not task_def: raise NameError(f"Global task '{task_name}' is not defined.")
+        items = await self.interpreter.eval_expr(items_expr, env)
+        if not isinstance(items, (list, PacketFile)): raise TypeError(f"Can only run '{task_name}' in parallel for each item in a list.")
+        if self.interpreter.parallel:
+            results = await self.interpreter.parallel.map(self.interpreter, task_def, [[item] for item in items])
+        else:  # already inside a worker process
+            results = [await self.interpreter.call_task(task_def, [item]) for item in items]
+        if result_var: env.set(result_var, results, "List")
+
+    async def handle_perform_method(self, ins, env):
+        obj_name, method_name, args, result_var = ins.args
+        instance = env.get(obj_name)
+        result = await self.interpreter._call_method(instance, method_name, args, env)
+        if result_var: env.set(result_var, result)
+
+    async def handle_perform_task(self, ins, env):
+        task_name, args, result_var = ins.args
+        task = self.interpreter.global_tasks.get(task_name)
+        if not task: raise NameError(f"Global task '{task_name}' is not defined.")
+        # Each call gets its own scope, so parameters no longer overwrite globals.
+        result = await self.interpreter._call_task_or_method(task, args, env, None)
+        if result_var: env.set(result_var, result)
+
+    async def handle_await_all(self, ins, env):
+        timeout_expr, = ins.args
+        timeout = await self.interpreter.eval_expr(timeout_expr, env) if timeout_expr else None
         tasks = env.get("running_tasks")
         if tasks and len(tasks) > 0:
-            await asyncio.gather(*tasks)
             env.set("running_tasks", [])
-
-    async def handle_parse_json(self, line, env):
-        match = re.match(r'parse the json string (.+?) and store the result in (\w+)', line, re.I)
-        json_expr, var_name = match.groups()
+            # The first failure, or the timeout, cancels the tasks still running.
+            await wait_all(tasks, timeout)
+
+    def handle_task_stats(self, ins, env):
+        var_name, = ins.args
+        env.set(var_name, self.interpreter.scheduler.stats(), "Object")
+
+    async def handle_task_group(self, ins, env):
+        limit_expr, timeout_expr, var_name = ins.args
+        limit = await self.interpreter.eval_expr(limit_expr, env) if limit_expr else None
+        timeout = await self.interpreter.eval_expr(timeout_expr, env) if timeout_expr else None
+        group = TaskGroup(self.interpreter.scheduler, limit, timeout)
+        results = await group.run(lambda: self.execute(ins.body, env))
+        if var_name: env.set(var_name, results, "List")
+        return group.returned  # a 'return' in the body takes effect once the group's tasks are done
+
+    async def handle_parse_json(self, ins, env):
+        json_expr, var_name = ins.args
         json_string = await self.interpreter.eval_expr(json_expr, env)
         data = json.loads(json_string)
         env.set(var_name, data, "Object")
 
-    async def handle_return(self, line, env):
-        expr = line.split(" ", 1)[1]
-        value = await self.interpreter.eval_expr(expr, env)
-        raise ReturnValue(value)
+    def handle_return(self, ins, env):
+        expr, = ins.args
+        return ReturnValue(bind_expression(expr, env.scope).evaluate(env))
 
-    async def handle_print(self, line, env):
-        expr = re.search(r'(?:show me|print|display)\s+(.+)', line, re.I).group(1)
+    async def handle_print(self, ins, env):
+        expr, = ins.args
         value = await self.interpreter.eval_expr(expr, env)
         if hasattr(value, 'summary'):
             print(value.summary())
         else:
             print(value)
 
-    async def handle_math(self, line, op, env):
-        patterns = {
-            'add': r'add (.+) to (.+)', 'subtract': r'subtract (.+) from (.+)',
-            'multiply': r'multiply (.+) by (.+)', 'divide': r'divide (.+) by (.+)'
-        }
-        match = re.match(patterns[op], line, re.I)
-        if not match: raise SyntaxError(f"Invalid math operation: {line}")
-
-        str1, str2 = match.groups()
-        if op in ['add', 'subtract']:
-            val_expr, target_expr = str1, str2
+    async def handle_math(self, ins, env):
+        op, first, second = ins.args
+        val_expr, target_expr = (first, second) if op.lower() in ('add', 'subtract') else (second, first)
+        result = await self._math(op, val_expr, target_expr, env)
+        if result is not None:
+            # Assign the computed value directly rather than formatting it back into source text.
+            self.assign_variable(target_expr.source, result, env)
+
+    async def handle_math_property(self, ins, env):
+        # "add 1 to host's hits": the target was split into object and property when compiled.
+        op, *parts = ins.args
+        if op.lower() in ('add', 'subtract'):
+            val_expr, target_expr, obj_name, prop = parts
         else:
-            target_expr, val_expr = str1, str2
-        
+            target_expr, obj_name, prop, val_expr = parts
+        result = await self._math(op, val_expr, target_expr, env)
+        if result is not None:
+            self.assign_property(obj_name, prop, result, env)
+
+    async def _math(self, op, val_expr, target_expr, env):
+        """The new value of the target, or None if an 'add' already appended to a StringBuilder."""
         val = await self.interpreter.eval_expr(val_expr, env)
         target_val = await self.interpreter.eval_expr(target_expr, env)
-        ops = {'add': target_val + val, 'subtract': target_val - val,
-               'multiply': target_val * val, 'divide': target_val / val}
-        set_command = f"set {target_expr} to {ops[op]}"
-        await self.handle_set(set_command, env)
-
-    async def handle_file_write(self, line, env):
-        match = re.match(r'write (.+) to the file (.+)', line, re.I)
-        if not match:
-             raise SyntaxError(f"Invalid file write syntax: {line}")
-        expr, filepath_expr = match.groups()
+        op = op.lower()
+        if op == 'add' and isinstance(target_val, StringBuilder):
+            target_val.append(val)  # in place, without joining the text built so far
+            return None
+        return _MATH_OPS[op](target_val, val)
+
+    async def handle_file_write(self, ins, env):
+        expr, filepath_expr = ins.args
         content = await self.interpreter.eval_expr(expr, env)
         filepath = await self.interpreter.eval_expr(filepath_expr, env)
+        self.interpreter.files.close(filepath)  # appends still buffered must not land after the new contents
         with open(filepath, 'w') as f: f.write(str(content))
 
-    async def handle_arp_scan(self, line, env):
-        match = re.match(r'perform an arp scan on (.+?) and store the results in (\w+)', line, re.I)
-        network_expr, var_name = match.groups()
+    async def handle_file_append(self, ins, env):
+        expr, filepath_expr = ins.args
+        content = await self.interpreter.eval_expr(expr, env)
+        filepath = await self.interpreter.eval_expr(filepath_expr, env)
+        self.interpreter.files.append(filepath, f"{content}\n")
+
+    async def handle_file_flush(self, ins, env):
+        filepath_expr, = ins.args
+        self.interpreter.files.flush(await self.interpreter.eval_expr(filepath_expr, env))
+
+    async def handle_file_close(self, ins, env):
+        filepath_expr, = ins.args
+        self.interpreter.files.close(await self.interpreter.eval_expr(filepath_expr, env))
+
+    async def handle_pcap_read(self, ins, env):
+        path_expr, var_name = ins.args
+        path = await self.interpreter.eval_expr(path_expr, env)
+        with open(path, 'rb'):
+            pass  # fail now on a missing file rather than on the first 'for each'
+        env.set(var_name, PacketFile(path), "Packets")
+
+    async def handle_pcap_write(self, ins, env):
+        packets_expr, path_expr = ins.args
+        packets = await self.interpreter.eval_expr(packets_expr, env)
+        path = await self.interpreter.eval_expr(path_expr, env)
+        count = await asyncio.to_thread(write_packets, path, packets)
+        print(f"Wrote {count} packets to '{path}'.")
+
+    async def handle_count_packets(self, ins, env):
+        packets_expr, field, var_name = ins.args
+        packets = await self.interpreter.eval_expr(packets_expr, env)
+        # Building the columns is the expensive part; keep the event loop free meanwhile.
+        env.set(var_name, await asyncio.to_thread(aggregate.count_by, packets, field), "Object")
+
+    async def handle_sum_bytes(self, ins, env):
+        packets_expr, field, var_name = ins.args
+        packets = await self.interpreter.eval_expr(packets_expr, env)
+        env.set(var_name, await asyncio.to_thread(aggregate.bytes_by, packets, field), "Object")
+
+    async def handle_top_packets(self, ins, env):
+        n_expr, field, packets_expr, measure, var_name = ins.args
+        n = await self.interpreter.eval_expr(n_expr, env)
+        packets = await self.interpreter.eval_expr(packets_expr, env)
+        result = await asyncio.to_thread(aggregate.top, packets, field, n, measure.lower())
+        env.set(var_name, result, "List of Object")
+
+    async def handle_arp_scan(self, ins, env):
+        network_expr, var_name = ins.args
         network_cidr = await self.interpreter.eval_expr(network_expr, env)
         print(f"Starting ARP scan on {network_cidr}... (This may require root privileges)")
         try:
@@ -308,16 +599,20 @@ class Executor:
         env.set(var_name, results, "List of Object")
         print(f"ARP scan complete. Found {len(results)} hosts.")
 
-    async def handle_ping(self, line, env):
-        match = re.match(r'perform a ping to (.+?) and store the result in (\w+)', line, re.I)
-        if not match: raise SyntaxError("Invalid ping command syntax.")
-        
-        host_expr, var_name = match.groups()
-        host = await self.interpreter.eval_expr(host_expr, env)
-        print(f"Pinging {host}... (This may require root privileges)")
-        
+    async def handle_ping(self, ins, env):
+        host_expr, var_name = ins.args
+        target = await self.interpreter.eval_expr(host_expr, env)
+        hosts = expand_hosts(target)
+        if hosts is None:
+            print(f"Pinging {target}... (This may require root privileges)")
+            env.set(var_name, await asyncio.to_thread(self._ping, target), "String")
+        else:
+            print(f"Pinging {len(hosts)} hosts... (This may require root privileges)")
+            env.set(var_name, await probe_hosts(hosts, self._ping, self.host_workers), "Object")
+
+    def _ping(self, host):
         try:
-            ans, unans = await asyncio.to_thread(sr, IP(dst=host)/ICMP(), timeout=4, verbose=False)
+            ans, unans = sr(IP(dst=host)/ICMP(), timeout=4, verbose=False)
             summary = ""
             if ans:
                 summary += f"Received {len(ans)} packets from {host}:\n"
@@ -325,85 +620,76 @@ class Executor:
                     summary += f"  - Reply from {received.src}: time={(received.time - sent.sent_time)*1000:.2f}ms\n"
             if unans:
                 summary += f"Lost {len(unans)} packets.\n"
-            
-            env.set(var_name, summary.strip(), "String")
-            print("Ping complete.")
+            print(f"Ping to {host} complete.")
+            return summary.strip()
         except PermissionError:
             raise PermissionError("Ping operations require root/administrator privileges.")
         except Exception as e:
-            env.set(var_name, f"Ping failed: {e}", "String")
-            print(f"Ping failed: {e}")
-
-    async def handle_traceroute(self, line, env):
-        match = re.match(r'perform a traceroute to (.+?) and store the result in (\w+)', line, re.I)
-        if not match: raise SyntaxError("Invalid traceroute command syntax.")
-
-        host_expr, var_name = match.groups()
-        host = await self.interpreter.eval_expr(host_expr, env)
-        print(f"Performing traceroute to {host}... (This may require root privileges)")
+            print(f"Ping to {host} failed: {e}")
+            return f"Ping failed: {e}"
+
+    async def handle_traceroute(self, ins, env):
+        host_expr, var_name = ins.args
+        target = await self.interpreter.eval_expr(host_expr, env)
+        hosts = expand_hosts(target)
+        if hosts is None:
+            print(f"Performing traceroute to {target}... (This may require root privileges)")
+            env.set(var_name, await asyncio.to_thread(self._traceroute, target), "String")
+        else:
+            print(f"Performing traceroute to {len(hosts)} hosts... (This may require root privileges)")
+            env.set(var_name, await probe_hosts(hosts, self._traceroute, self.host_workers), "Object")
 
+    def _traceroute(self, host):
         try:
-            results, _ = await asyncio.to_thread(traceroute, host, verbose=False)
+            results, _ = traceroute(host, verbose=False)
             output = f"Traceroute to {host}:\n"
             output += "Hop\tRTT (ms)\tAddress\n"
             output += "---------------------------------------\n"
-            
+
             trace = results.get_trace()
             for dest, hops in trace.items():
                 for ttl, (ip, rtt) in sorted(hops.items()):
                     output += f"{ttl}\t{rtt*1000:<15.2f}\t{ip}\n"
 
-            env.set(var_name, output, "String")
-            print("Traceroute complete.")
+            print(f"Traceroute to {host} complete.")
+            return output
         except PermissionError:
             raise PermissionError("Traceroute operations require root/administrator privileges.")
         except Exception as e:
-            env.set(var_name, f"Traceroute failed: {e}", "String")
-            print(f"Traceroute failed: {e}")
+            print(f"Traceroute to {host} failed: {e}")
+            return f"Traceroute failed: {e}"
 
-    async def handle_port_scan(self, line, env):
-        match = re.match(r'perform a port scan on (.+?) for ports (.+?) and store the results in (\w+)', line, re.I)
-        if not match: raise SyntaxError("Invalid port scan command.")
-
-        host_expr, ports_expr, var_name = match.groups()
-        host = await self.interpreter.eval_expr(host_expr, env)
+    async def handle_port_scan(self, ins, env):
+        host_expr, ports_expr, rate_expr, background, var_name = ins.args
+        target = await self.interpreter.eval_expr(host_expr, env)
         ports_str = await self.interpreter.eval_expr(ports_expr, env)
-        
-        if '-' in ports_str:
-            start, end = map(int, ports_str.split('-'))
-            ports = range(start, end + 1)
-        else:
-            ports = [int(p.strip()) for p in ports_str.split(',')]
+        rate = await self.interpreter.eval_expr(rate_expr, env) if rate_expr else None
 
-        print(f"Scanning {host} for ports {ports_str}... (This may require root privileges)")
-        
-        ans, unans = await asyncio.to_thread(sr, IP(dst=host)/TCP(dport=ports, flags="S"), timeout=5, verbose=False)
-        
+        # A list or CIDR scans every host at once and keys the results by host.
+        hosts = expand_hosts(target)
+        if hosts is None:
+            hosts = target
+            print(f"Scanning {target} for ports {ports_str}... (This may require root privileges)")
+        else:
+            print(f"Scanning {len(hosts)} hosts for ports {ports_str}... (This may require root privileges)")
+        # Results fill in batch by batch, so a background scan can be read while it runs.
         results = {}
-        for sent, received in ans:
-            port = sent[TCP].dport
-            flag = received[TCP].flags
-            if flag == 0x12:
-                results[port] = "Open"
-            elif flag == 0x14:
-                results[port] = "Closed"
-        
-        for sent in unans:
-            results[sent[TCP].dport] = "Filtered"
-
         env.set(var_name, results, "Object")
-        print("Port scan complete.")
-
 
-    async def handle_send_packet(self, line, env):
-        match = re.match(r'send packet (.+?) and store the reply in (\w+)', line, re.I)
-        if not match:
-            raise SyntaxError("Invalid send packet command.")
+        async def scan():
+            await self.scanner.scan(hosts, ports_str, results, rate=rate)
+            print("Port scan complete.")
+        if background:
+            # Waited on like an asynchronous task.
+            self.start_background(scan(), env)
+        else:
+            await scan()
 
-        packet_expr_str, reply_var = match.groups()
+    async def handle_send_packet(self, ins, env):
+        packet_expr_str, reply_var = ins.args
         
         # Evaluate the packet expression to get the actual packet object
-        packet_to_send = await self.interpreter.eval_expr(packet_expr_str.strip(), env) # Use eval_expr here
+        packet_to_send = await self.interpreter.eval_expr(packet_expr_str, env) # Use eval_expr here
         
         # Dynamically determine the destination for printing based on available layers
         destination_info = "unknown destination"
@@ -437,11 +723,8 @@ class Executor:
         except PermissionError:
             raise PermissionError("Sending custom packets requires root/administrator privileges.")
             
-    async def handle_sniff(self, line, env):
-        match = re.match(r'start sniffing on interface (.+?) with filter "(.+?)" for (\d+) seconds and store packets in (\w+)', line, re.I)
-        if not match: raise SyntaxError("Invalid sniff command.")
-
-        iface_expr, filter_expr, duration_str, var_name = match.groups()
+    async def handle_sniff(self, ins, env):
+        iface_expr, filter_expr, duration_str, var_name = ins.args
         
         iface = await self.interpreter.eval_expr(iface_expr, env)
         bpf_filter = filter_expr
@@ -455,3 +738,27 @@ class Executor:
             print(f"Sniffing complete. Captured {len(packets)} packets.")
         except PermissionError:
             raise PermissionError("Sniffing requires root/administrator privileges.")
+
+    async def handle_stream_sniff(self, ins, env):
+        iface_expr, file_expr, bpf_filter, duration, max_packets, max_bytes, task_name, batch_size = ins.args
+        task_def = self.interpreter.global_tasks.get(task_name)
+        if not task_def: raise NameError(f"Global task '{task_name}' is not defined.")
+        limits = dict(bpf_filter=bpf_filter, max_packets=int(max_packets) if max_packets else None,
+                      max_bytes=int(max_bytes) if max_bytes else None,
+                      batch_size=int(batch_size) if batch_size else None, queue_size=self.capture_queue_size)
+        if file_expr:
+            source = await self.interpreter.eval_expr(file_expr, env)
+            stream = PacketStream(offline=source, **limits)
+            print(f"Reading packets from '{source}'...")
+        else:
+            source = await self.interpreter.eval_expr(iface_expr, env)
+            stream = PacketStream(iface=source, timeout=int(duration) if duration else None, **limits)
+            print(f"Starting packet sniff on {source} with filter '{bpf_filter or ''}'...")
+
+        async def handle(item):
+            await self.interpreter.call_task(task_def, [item])
+        try:
+            await stream.run(handle)
+        except PermissionError:
+            raise PermissionError("Sniffing requires root/administrator privileges.")
+        print(f"Sniffing complete. Handled {stream.packets} packets ({stream.bytes} bytes).")
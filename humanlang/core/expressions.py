@@ -0,0 +1,543 @@
+import re
+import ast
+import operator
+from collections import OrderedDict
+from .structures import ObjectInstance, UNSET
+
+# Expressions are compiled once per distinct source text into a small tree of
+# nodes and evaluated directly against an Environment.
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>\d+(?:\.\d+)?(?![\w.]))
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<op>==|!=|<=|>=|[-+*/%<>()\[\]{},:])
+  | (?P<word>\w+)
+""", re.VERBOSE)
+
+_POSSESSIVE_RE = re.compile(r"'s\b")
+
+_CONSTANTS = {'true': True, 'false': False, 'none': None}
+
+
+class ExpressionSyntaxError(Exception): pass
+
+
+def _tokenize(text):
+    tokens = []
+    pos, end = 0, len(text)
+    while pos < end:
+        # "host's ip" - a possessive directly after a name, index or group
+        if text[pos] == "'" and tokens and tokens[-1][0] in ('word', 'string', ']', ')'):
+            possessive = _POSSESSIVE_RE.match(text, pos)
+            if possessive:
+                tokens.append(("'s", "'s"))
+                pos = possessive.end()
+                continue
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise ExpressionSyntaxError(f"Unexpected character {text[pos]!r} in expression.")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'number':
+            tokens.append(('number', float(value) if '.' in value else int(value)))
+        elif kind == 'string':
+            tokens.append(('string', ast.literal_eval(value) if '\\' in value else value[1:-1]))
+        elif kind == 'op':
+            tokens.append((value, value))
+        elif kind == 'word':
+            tokens.append(('word', value))
+        pos = match.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+def get_property(value, key):
+    """Reads one step of an `x's key` path, returning None when it does not exist."""
+    if key == 'length' and hasattr(value, '__len__'):
+        return len(value)
+    if isinstance(value, ObjectInstance):
+        return value.get(key)
+    if isinstance(value, dict):
+        return value.get(key)
+    if hasattr(value, key):
+        prop = getattr(value, key)
+        return prop() if callable(prop) else prop
+    return None
+
+
+def _contains(container, item):
+    return item in container
+
+
+def _not_contains(container, item):
+    return item not in container
+
+
+def _plus(left, right):
+    # Text concatenation converts the other side, so "Count: " + 3 works.
+    if isinstance(left, str) or isinstance(right, str):
+        return f"{left}{right}"
+    return left + right
+
+
+class Literal:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def evaluate(self, env):
+        return self.value
+
+    def bind(self, scope):
+        return self
+
+
+class Name:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def evaluate(self, env):
+        return env.lookup(self.name)
+
+    def bind(self, scope):
+        address = scope.resolve(self.name)
+        if address is None:
+            return self
+        return (LocalSlot if address[0] == 0 else Slot)(self.name, *address)
+
+
+class Slot:
+    """A variable reference resolved to the scope depth and slot index it lives in."""
+    __slots__ = ('name', 'depth', 'index', 'owner')
+
+    def __init__(self, name, depth, index, owner):
+        self.name = name
+        self.depth = depth
+        self.index = index
+        self.owner = owner
+
+    def evaluate(self, env):
+        target, depth = env, self.depth
+        while depth:
+            target = target.outer
+            depth -= 1
+        # The chain only differs from the resolved one when a task runs outside its own program.
+        if target.scope is self.owner:
+            try:
+                value = target.slots[self.index]
+            except IndexError:
+                value = UNSET
+            if value is not UNSET:
+                return value
+        return env.lookup(self.name)
+
+    def bind(self, scope):
+        return self
+
+
+class LocalSlot(Slot):
+    """A Slot in the innermost scope, which needs no walk up the chain."""
+    __slots__ = ()
+
+    def evaluate(self, env):
+        if env.scope is self.owner:
+            try:
+                value = env.slots[self.index]
+            except IndexError:
+                value = UNSET
+            if value is not UNSET:
+                return value
+        return env.lookup(self.name)
+
+
+class Property:
+    """`x's key`. Remembers the slot the key had in the last class it saw, so objects read straight from it."""
+    __slots__ = ('target', 'key', 'cls', 'slot')
+
+    def __init__(self, target, key):
+        self.target = target
+        self.key = key
+        self.cls = None
+        self.slot = None
+
+    def evaluate(self, env):
+        value = self.target.evaluate(env)
+        if value is None:
+            return None
+        if type(value) is ObjectInstance:
+            cls = value.class_def
+            if cls is not self.cls:
+                slot = cls.layout.get(self.key)
+                if slot is None:
+                    return value.get(self.key)
+                self.cls, self.slot = cls, slot
+            return value.values[self.slot]
+        return get_property(value, self.key)
+
+    def bind(self, scope):
+        return Property(self.target.bind(scope), self.key)
+
+
+class Index:
+    __slots__ = ('target', 'index')
+
+    def __init__(self, target, index):
+        self.target = target
+        self.index = index
+
+    def evaluate(self, env):
+        return self.target.evaluate(env)[self.index.evaluate(env)]
+
+    def bind(self, scope):
+        return Index(self.target.bind(scope), self.index.bind(scope))
+
+
+class ListDisplay:
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def evaluate(self, env):
+        return [item.evaluate(env) for item in self.items]
+
+    def bind(self, scope):
+        return ListDisplay([item.bind(scope) for item in self.items])
+
+
+class DictDisplay:
+    __slots__ = ('pairs',)
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def evaluate(self, env):
+        return {key.evaluate(env): value.evaluate(env) for key, value in self.pairs}
+
+    def bind(self, scope):
+        return DictDisplay([(key.bind(scope), value.bind(scope)) for key, value in self.pairs])
+
+
+class Unary:
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+    def evaluate(self, env):
+        return self.op(self.operand.evaluate(env))
+
+    def bind(self, scope):
+        return Unary(self.op, self.operand.bind(scope))
+
+
+class Binary:
+    __slots__ = ('op', 'left', 'right')
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+    def evaluate(self, env):
+        return self.op(self.left.evaluate(env), self.right.evaluate(env))
+
+    def bind(self, scope):
+        return Binary(self.op, self.left.bind(scope), self.right.bind(scope))
+
+
+class And:
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def evaluate(self, env):
+        return self.left.evaluate(env) and self.right.evaluate(env)
+
+    def bind(self, scope):
+        return And(self.left.bind(scope), self.right.bind(scope))
+
+
+class Or:
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def evaluate(self, env):
+        return self.left.evaluate(env) or self.right.evaluate(env)
+
+    def bind(self, scope):
+        return Or(self.left.bind(scope), self.right.bind(scope))
+
+
+class Expression:
+    """A compiled expression. Unknown names and malformed text evaluate to the raw text."""
+    __slots__ = ('root', 'source', 'fallback')
+
+    def __init__(self, root, source, fallback=None):
+        self.root = root
+        self.source = source
+        self.fallback = fallback  # worked out on first use; most expressions never need it
+
+    def bind(self, scope):
+        root = self.root.bind(scope) if self.root is not None else None
+        if root is self.root:
+            return self
+        return Expression(root, self.source, self.fallback)
+
+    def fallback_text(self):
+        if self.fallback is None:
+            self.fallback = _fallback_text(self.source)
+        return self.fallback
+
+    def evaluate(self, env):
+        if self.root is None:
+            return self.fallback_text()
+        try:
+            return self.root.evaluate(env)
+        except TypeError:
+            raise
+        except Exception:
+            return self.fallback_text()
+
+
+def _fallback_text(source):
+    first_quote, last_quote = source.find('"'), source.rfind('"')
+    if first_quote != -1 and first_quote < last_quote:
+        return source[first_quote + 1:last_quote]
+    return source.strip("'\"")
+
+
+_COMPARISONS = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+    '>': operator.gt, '<=': operator.le, '>=': operator.ge,
+}
+_ADDITIVE = {'+': _plus, 'plus': _plus, '-': operator.sub, 'minus': operator.sub}
+_MULTIPLICATIVE = {'*': operator.mul, 'times': operator.mul, '/': operator.truediv, '%': operator.mod}
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def word(self, offset=0):
+        kind, value = self.tokens[self.pos + offset]
+        return value.lower() if kind == 'word' else None
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, kind):
+        token = self.advance()
+        if token[0] != kind:
+            raise ExpressionSyntaxError(f"Expected '{kind}' but found {token[1]!r}.")
+        return token
+
+    def expect_words(self, *words):
+        for word in words:
+            if self.word() != word:
+                raise ExpressionSyntaxError(f"Expected '{word}' in expression.")
+            self.advance()
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek()[0] != 'end':
+            raise ExpressionSyntaxError(f"Unexpected {self.peek()[1]!r} in expression.")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.word() == 'or':
+            self.advance()
+            node = Or(node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.word() == 'and':
+            self.advance()
+            node = And(node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.word() == 'not':
+            self.advance()
+            return Unary(operator.not_, self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        node = self.parse_additive()
+        while True:
+            kind = self.peek()[0]
+            if kind in _COMPARISONS:
+                self.advance()
+                node = Binary(_COMPARISONS[kind], node, self.parse_additive())
+            elif self.word() == 'is':
+                self.advance()
+                node = self.parse_is(node)
+            elif self.word() == 'contains':
+                self.advance()
+                node = Binary(_contains, node, self.parse_additive())
+            elif self.word() == 'does' and self.word(1) == 'not':
+                self.expect_words('does', 'not', 'contain')
+                node = Binary(_not_contains, node, self.parse_additive())
+            else:
+                return node
+
+    def parse_is(self, left):
+        word = self.word()
+        if word in ('true', 'false'):
+            self.advance()
+            return Binary(operator.eq, left, Literal(word == 'true'))
+        if word == 'equal':
+            self.expect_words('equal', 'to')
+            return Binary(operator.eq, left, self.parse_additive())
+        if word == 'greater' or word == 'less':
+            self.advance()
+            self.expect_words('than')
+            op = operator.gt if word == 'greater' else operator.lt
+            if self.word() == 'or' and self.word(1) == 'equal':
+                self.expect_words('or', 'equal', 'to')
+                op = operator.ge if word == 'greater' else operator.le
+            return Binary(op, left, self.parse_additive())
+        if word == 'not':
+            self.advance()
+            if self.word() == 'equal':
+                self.expect_words('equal', 'to')
+                return Binary(operator.ne, left, self.parse_additive())
+            return Binary(operator.is_not, left, self.parse_additive())
+        return Binary(operator.is_, left, self.parse_additive())
+
+    def parse_additive(self):
+        node = self.parse_term()
+        while True:
+            kind, value = self.peek()
+            key = kind if kind in ('+', '-') else self.word()
+            if key not in _ADDITIVE:
+                return node
+            self.advance()
+            node = Binary(_ADDITIVE[key], node, self.parse_term())
+
+    def parse_term(self):
+        node = self.parse_unary()
+        while True:
+            kind, value = self.peek()
+            key = kind if kind in ('*', '/', '%') else self.word()
+            if key == 'divided':
+                self.advance()
+                self.expect_words('by')
+                key = '/'
+            elif key in _MULTIPLICATIVE:
+                self.advance()
+            else:
+                return node
+            node = Binary(_MULTIPLICATIVE[key], node, self.parse_unary())
+
+    def parse_unary(self):
+        if self.peek()[0] == '-':
+            self.advance()
+            return Unary(operator.neg, self.parse_unary())
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        node = self.parse_primary()
+        while True:
+            kind = self.peek()[0]
+            if kind == "'s":
+                self.advance()
+                node = Property(node, self.expect('word')[1].lower())
+            elif kind == '[':
+                self.advance()
+                index = self.parse_or()
+                self.expect(']')
+                node = Index(node, index)
+            else:
+                return node
+
+    def parse_primary(self):
+        kind, value = self.advance()
+        if kind in ('number', 'string'):
+            return Literal(value)
+        if kind == 'word':
+            if value.lower() in _CONSTANTS:
+                return Literal(_CONSTANTS[value.lower()])
+            return Name(value)
+        if kind == '(':
+            node = self.parse_or()
+            self.expect(')')
+            return node
+        if kind == '[':
+            return ListDisplay(self.parse_items(']'))
+        if kind == '{':
+            pairs = []
+            while self.peek()[0] != '}':
+                key = self.parse_or()
+                self.expect(':')
+                pairs.append((key, self.parse_or()))
+                if self.peek()[0] != ',':
+                    break
+                self.advance()
+            self.expect('}')
+            return DictDisplay(pairs)
+        raise ExpressionSyntaxError(f"Unexpected {value!r} in expression.")
+
+    def parse_items(self, closer):
+        items = []
+        while self.peek()[0] != closer:
+            items.append(self.parse_or())
+            if self.peek()[0] != ',':
+                break
+            self.advance()
+        self.expect(closer)
+        return items
+
+
+# The most recently used compiled expressions, by source text. Instructions keep
+# their own compiled expressions, so this only saves re-parsing repeated text; it
+# is bounded because a long-running server compiles script after script.
+_cache = OrderedDict()
+_CACHE_SIZE = 4096
+
+def compile_expression(text):
+    """Returns the cached compiled form of an expression's source text."""
+    compiled = _cache.get(text)
+    if compiled is None:
+        source = text.strip()
+        try:
+            root = _Parser(source).parse()
+        except (ExpressionSyntaxError, SyntaxError, ValueError):
+            root = None
+        compiled = _cache[text] = Expression(root, source)
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(text)
+    return compiled
+
+
+def bind_expression(expr, scope):
+    """
+    Returns the expression with its variables resolved to slots of the given scope.
+    Accepts source text or an already compiled Expression.
+    """
+    scope.check_generation()
+    bound = scope.expressions.get(expr)
+    if bound is None:
+        compiled = compile_expression(expr) if isinstance(expr, str) else expr
+        bound = scope.expressions[expr] = compiled.bind(scope)
+    return bound
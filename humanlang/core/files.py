@@ -0,0 +1,52 @@
+import os
+
+# Text files are read and appended through buffers this big, so a loop over a
+# huge file, or a report written one line per host, costs one system call per
+# buffer rather than one per line.
+BUFFER_SIZE = 1 << 16
+
+
+class FileHandles:
+    """
+    The files a run appends to. Each file is opened once, on its first 'append',
+    and stays open with a write buffer until the script flushes or closes it, or
+    the run ends. Reading or rewriting a file first hands over whatever is still
+    buffered for it, so a script always sees its own appends.
+    """
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._handles = {}  # absolute path -> open file
+
+    def _key(self, path):
+        return os.path.abspath(str(path))
+
+    def append(self, path, text):
+        key = self._key(path)
+        handle = self._handles.get(key)
+        if handle is None:
+            handle = self._handles[key] = open(key, 'a', buffering=self.buffer_size)
+        handle.write(text)
+
+    def flush(self, path):
+        handle = self._handles.get(self._key(path))
+        if handle is not None:
+            handle.flush()
+
+    def close(self, path):
+        handle = self._handles.pop(self._key(path), None)
+        if handle is not None:
+            handle.close()
+
+    def read(self, path):
+        """Opens a file for reading line by line, after writing out anything appended to it."""
+        self.flush(path)
+        return open(path, 'r', buffering=self.buffer_size)
+
+    def flush_all(self):
+        for handle in self._handles.values():
+            handle.flush()
+
+    def close_all(self):
+        handles, self._handles = self._handles, {}
+        for handle in handles.values():
+            handle.close()
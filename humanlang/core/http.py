@@ -0,0 +1,42 @@
+import asyncio
+import aiohttp
+
+
+class HttpClient:
+    """
+    A pooled HTTP client shared by everything one interpreter runs, so repeated
+    requests reuse open (keep-alive) connections and cached DNS lookups instead of
+    handshaking every time. The session is opened on first use and belongs to the
+    event loop it was opened on.
+    """
+    def __init__(self, limit=100, limit_per_host=10, dns_ttl=300, timeout=30, connect_timeout=10):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session = None
+        self._loop = None
+
+    def session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             ttl_dns_cache=self.dns_ttl)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def get_text(self, url):
+        async with self.session().get(url) as response:
+            if not response.ok: raise IOError(f"HTTP request to {url} failed with status {response.status}")
+            return await response.text()
+
+    async def get_all(self, urls):
+        """Fetches every URL concurrently (within the connection limits), returning the bodies in order."""
+        return list(await asyncio.gather(*(self.get_text(url) for url in urls)))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed and self._loop is asyncio.get_running_loop():
+            await self._session.close()
+        self._session = None
+        self._loop = None
@@ -2,70 +2,178 @@ import os
 import re
 import sys
 import asyncio
-from .structures import Environment, ClassDefinition, ObjectInstance, ReturnValue, TypeSystemError
-from .parser import parse_code
+import hashlib
+from .structures import Environment, ClassDefinition, TypeSystemError
+from .parser import parse_code, read_statements, locate, describe
 from .type_checker import TypeChecker
 from .executor import Executor
+from .resolver import Resolver
+from .expressions import bind_expression
+from .cache import ProgramCache, CompiledProgram, fingerprint, is_current
+from .modules import registry as default_registry
+from .http import HttpClient
+from .files import FileHandles
+from .scheduler import Scheduler
+from .parallel import ParallelRunner
+from .profiler import ProfilingExecutor
+
+def _block_digest(block):
+    """A hash of a block's statements and nesting, to tell whether a task changed since it was last checked."""
+    digest = hashlib.sha256()
+
+    def feed(items):
+        for item in items:
+            if isinstance(item, list):
+                digest.update(b'[')
+                feed(item)
+                digest.update(b']')
+            else:
+                digest.update(item.text.encode())
+                digest.update(b'\n')
+    feed(block)
+    return digest.hexdigest()
 
 class HumanLang:
-    def __init__(self):
+    def __init__(self, registry=None, http=None, scheduler=None, parallel=None, profiler=None, files=None,
+                 programs=None):
         self.global_env = Environment()
         self.classes = {}
         self.global_tasks = {}
-        self._imported_libs = set()
+        self.path = None
+        self.registry = registry or default_registry
+        self.http = http or HttpClient()
+        self.files = files or FileHandles()
+        self.scheduler = scheduler or Scheduler()
+        self.parallel = parallel or ParallelRunner()
+        self.programs = programs  # compiled programs kept in memory across runs, if given
+        self.dependencies = set()
+        self.module_envs = {}
+        self.summary = None  # the TypeSummary other files check against
+        self.profiler = profiler
         self.type_checker = TypeChecker(self)
-        self.executor = Executor(self)
+        self.resolver = Resolver(self)
+        self.executor = ProfilingExecutor(self, profiler) if profiler else Executor(self)
+
+    async def close(self):
+        """Releases what the run held open: appended files, pooled HTTP connections and worker processes."""
+        self.files.close_all()
+        await self.http.close()
+        if self.parallel:
+            await asyncio.to_thread(self.parallel.close)
 
     async def run_from_file(self, filepath):
-        abs_filepath = os.path.abspath(filepath)
-        if abs_filepath in self._imported_libs:
-            return
-        self._imported_libs.add(abs_filepath)
+        abs_filepath = self.path = os.path.abspath(filepath)
         base_dir = os.path.dirname(abs_filepath)
         try:
-            with open(abs_filepath, 'r') as f:
-                lines = [line.strip().rstrip('.') for line in f if line.strip()]
-            code_blocks = parse_code(lines)
-            await self.pre_process(code_blocks, base_dir)
-            self.type_checker.check(code_blocks, self.global_env)
+            cache = ProgramCache(abs_filepath, self.programs)
+            compiled = cache.load()
+            if compiled and await self.load_compiled(compiled):
+                cache.refresh(compiled)
+            else:
+                compiled = await self.compile_file(abs_filepath, base_dir, compiled or cache.previous)
+                cache.store(compiled)
             print("Type checking passed successfully.")
-            await self.executor.execute(code_blocks, self.global_env)
+            await self.executor.execute(compiled.program, self.global_env)
         except (TypeSystemError, NameError, ValueError, TypeError, SyntaxError, AttributeError) as e:
-            print(f"Error: {e}")
+            print(f"Error: {describe(e)}")
             sys.exit(1)
-        except FileNotFoundError:
-            print(f"Fatal Error: File not found at '{filepath}'")
+        except FileNotFoundError as e:
+            if getattr(e, 'statement', None) is None:
+                print(f"Fatal Error: File not found at '{filepath}'")
+            else:  # a file the script itself tried to open
+                print(f"Error: {describe(e)}")
             sys.exit(1)
 
-    async def pre_process(self, blocks, base_dir):
+    async def compile_file(self, abs_filepath, base_dir, previous=None):
+        """
+        Parses, checks, resolves and compiles a source file into a cacheable CompiledProgram.
+        'previous' is an earlier compile of the file: task bodies it checked against the
+        same summary, and that have not changed since, are not checked again.
+        """
+        source = fingerprint(abs_filepath)
+        code_blocks = parse_code(read_statements(abs_filepath))
+        imports = await self.import_libraries(code_blocks, base_dir)
+        imported_classes, imported_tasks = dict(self.classes), dict(self.global_tasks)
+        self.pre_process(code_blocks)
+        self.type_checker.check(code_blocks, self.global_env)
+        self.summary = self.type_checker.summary(self.global_env)
+        verified = previous.checked if previous and previous.summary.digest == self.summary.digest else frozenset()
+        checked = self.type_checker.check_tasks(self.global_env, verified)
+        self.resolver.resolve(code_blocks, self.global_env.scope)
+        program = self.executor.compile_program(code_blocks)
+
+        # Only this file's own definitions are cached; libraries are re-imported from their own caches.
+        classes = {n: c for n, c in self.classes.items() if imported_classes.get(n) is not c}
+        tasks = {n: t for n, t in self.global_tasks.items() if imported_tasks.get(n) is not t}
+        dependencies = {path: fingerprint(path) for path in self.dependencies
+                        if path != abs_filepath and os.path.exists(path)}
+        summaries = {path: self.registry.summary(path) for path in imports}
+        return CompiledProgram(source, dependencies, summaries, imports, program, classes, tasks,
+                               self.global_env.scope, self.global_env.types, self.summary, frozenset(checked))
+
+    async def load_compiled(self, compiled):
+        """
+        Installs a cached program without parsing or checking anything. Returns False,
+        installing nothing, if a library it uses changed what this file was checked
+        against; a library that only changed inside its task bodies does not count.
+        """
+        modules = await self.load_modules(compiled.imports)
+        if not all(is_current(path, known) for path, known in compiled.dependencies.items()):
+            if any(self.registry.summary(path) != digest for path, digest in compiled.summaries.items()):
+                return False  # the libraries stay loaded in the registry for the full compile
+        for module in modules:
+            if module:
+                self.import_module(module)
+        self.global_env = Environment(scope=compiled.scope)
+        self.global_env.types = dict(compiled.types) if compiled.types else None  # the program may be run again
+        for class_def in compiled.classes.values():
+            parent = class_def.parent
+            if parent is not None and compiled.classes.get(parent.name) is not parent:
+                # The cached copy of a library's class may be out of date; use the library's own.
+                class_def.parent = self.classes.get(parent.name, parent)
+            class_def.finalize()
+        self.classes.update(compiled.classes)
+        self.global_tasks.update(compiled.tasks)
+        self.summary = compiled.summary
+        return True
+
+    async def import_libraries(self, blocks, base_dir):
+        """Imports every 'use the library' line, returning the paths imported in order."""
+        imports = self.find_imports(blocks, base_dir)
+        await self.import_modules(imports)
+        return imports
+
+    def pre_process(self, blocks):
         for item in blocks:
             if isinstance(item, list):
-                head = item[0].lower().strip()
-                if head.startswith('define a class'):
-                    self.handle_define_class(item)
-                elif head.startswith(('define a task', 'define an asynchronous task')):
-                    self.handle_define_task(item, self.global_tasks)
-                await self.pre_process(item[1:], base_dir)
-            elif isinstance(item, str) and item.lower().startswith('use the library'):
-                await self.handle_library_import(item, base_dir)
+                head = item[0].text.lower()
+                try:
+                    if head.startswith('define a class'):
+                        self.handle_define_class(item)
+                    elif head.startswith(('define a task', 'define an asynchronous task', 'define a parallel task')):
+                        self.handle_define_task(item, self.global_tasks)
+                except Exception as e:
+                    raise locate(e, item[0])
+                self.pre_process(item[1:])
 
     def handle_define_class(self, block):
-        match = re.match(r'define a class named "([^"]+)"(?: that inherits from "([^"]+)")?', block[0], re.I)
+        match = re.match(r'define a class named "([^"]+)"(?: that inherits from "([^"]+)")?', block[0].text, re.I)
         class_name, parent_name = match.groups()
         parent_class = self.classes.get(parent_name) if parent_name else None
         class_def = ClassDefinition(class_name, parent_class)
         for item in block[1:]:
-            if isinstance(item, str) and item.lower().strip().startswith("it has a property"):
-                prop_match = re.match(r'it has a property named "([^"]+)" of type (.+)', item, re.I)
+            if not isinstance(item, list) and item.text.lower().startswith("it has a property"):
+                prop_match = re.match(r'it has a property named "([^"]+)" of type (.+)', item.text, re.I)
                 prop_name, prop_type = prop_match.groups()
                 class_def.properties[prop_name] = prop_type.strip()
-            elif isinstance(item, list) and item[0].lower().strip().startswith("define"):
+            elif isinstance(item, list) and item[0].text.lower().startswith("define"):
                 self.handle_define_task(item, class_def.methods)
-        self.classes[class_name] = class_def
+        self.classes[class_name] = class_def.finalize()
 
     def handle_define_task(self, block, task_dict):
-        full_def_line = block[0]
+        full_def_line = block[0].text
         is_async = "asynchronous" in full_def_line.lower()
+        is_parallel = full_def_line.lower().startswith('define a parallel task')
         name_match = re.search(r'task named "([^"]+)"', full_def_line, re.I)
         name = name_match.group(1)
         params_str_match = re.search(r'that accepts (.+?)(?:\s+and returns|\s*$)', full_def_line, re.I)
@@ -79,136 +187,113 @@ class HumanLang:
                 if not p_match: raise SyntaxError(f"Invalid parameter definition in task '{name}': {p_def}")
                 p_name, p_type = p_match.groups()
                 params.append({'name': p_name, 'type': p_type.strip()})
-        task_dict[name] = {'params': params, 'body': block[1:], 'returns': return_type, 'is_async': is_async}
-
-    async def handle_library_import(self, line, base_dir):
-        match = re.match(r'use the library "([^"]+)"', line, re.I)
-        if not match: return
-        lib_path = os.path.join(base_dir, match.group(1))
-        lib_interp = HumanLang()
-        lib_interp._imported_libs = self._imported_libs
-        await lib_interp.run_from_file(lib_path)
-        self.classes.update(lib_interp.classes)
-        self.global_tasks.update(lib_interp.global_tasks)
-
-    async def _call_method(self, instance, method_name, args_str, calling_env, start_class=None):
+        task_dict[name] = {'name': name, 'params': params, 'body': block[1:], 'returns': return_type,
+                           'is_async': is_async, 'is_parallel': is_parallel, 'digest': _block_digest(block)}
+
+    def task_definitions(self):
+        """Yields (task_def, is_method) for every global task and class method."""
+        for task_def in self.global_tasks.values():
+            yield task_def, False
+        for class_def in self.classes.values():
+            for task_def in class_def.methods.values():
+                yield task_def, True
+
+    def find_imports(self, blocks, base_dir):
+        imports = []
+        for item in blocks:
+            if isinstance(item, list):
+                imports += self.find_imports(item[1:], base_dir)
+            elif item.text.lower().startswith('use the library'):
+                lib_path = self.handle_library_import(item, base_dir)
+                if lib_path and lib_path not in imports:
+                    imports.append(lib_path)
+        return imports
+
+    def handle_library_import(self, line, base_dir):
+        match = re.match(r'use the library "([^"]+)"', line.text, re.I)
+        if not match: return None
+        return os.path.abspath(os.path.join(base_dir, match.group(1)))
+
+    async def import_modules(self, lib_paths):
+        """Loads independent libraries concurrently, then merges their definitions in import order."""
+        for module in await self.load_modules(lib_paths):
+            if module:
+                self.import_module(module)
+
+    async def load_modules(self, lib_paths):
+        """Loads libraries through the registry without merging their definitions into this file."""
+        return await asyncio.gather(*(self.registry.load(path, self.path, self._new_module_interpreter)
+                                      for path in lib_paths))
+
+    def _new_module_interpreter(self, lib_path):
+        return HumanLang(registry=self.registry, http=self.http, scheduler=self.scheduler, parallel=self.parallel,
+                         profiler=self.profiler, files=self.files, programs=self.programs)
+
+    def import_module(self, module):
+        self.classes.update(module.classes)
+        self.global_tasks.update(module.tasks)
+        self.dependencies.add(module.path)
+        self.dependencies.update(module.dependencies)
+        self.module_envs.update(module.interpreter.module_envs)
+        self.module_envs[module.global_env.scope] = module.global_env
+
+    def globals_for(self, definition):
+        """The global environment of the file a task or method was defined in."""
+        scope = definition.get('scope')
+        return self.module_envs.get(scope.outer if scope else None, self.global_env)
+
+    async def _call_method(self, instance, method_name, args, calling_env, start_class=None):
         cls_to_search = start_class or instance.class_def
         method = cls_to_search.find_method(method_name)
         if not method: raise NameError(f"Method '{method_name}' not found in class '{instance.class_def.name}'.")
-        method_env = Environment(outer=self.global_env)
-        method_env.set('this', instance, instance.class_def.name)
-        return await self._call_task_or_method(method, args_str, calling_env, method_env)
+        values = self.eval_args(method, args, calling_env)
+        return await self.call_task(method, values, this=instance)
 
-    async def _call_task_or_method(self, task_def, args_str, calling_env, execution_env):
-        if not execution_env:
-            execution_env = Environment(outer=self.global_env)
-        args = re.split(r',\s*(?=(?:[^"]*"[^"]*")*[^"]*$)', args_str) if args_str else []
+    async def _call_task_or_method(self, task_def, args, calling_env, execution_env):
+        values = self.eval_args(task_def, args, calling_env)
+        return await self.call_task(task_def, values, execution_env)
+
+    def eval_args(self, task_def, args, calling_env):
+        """Evaluates a call site's argument expressions, compiled once with the statement."""
         if len(args) != len(task_def['params']):
             raise ValueError(f"Incorrect number of arguments for task. Expected {len(task_def['params'])}, got {len(args)}.")
-        for param_def, arg_expr in zip(task_def['params'], args):
-            param_name, param_type = param_def['name'], param_def['type']
-            arg_value = await self.eval_expr(arg_expr.strip(), calling_env)
-            execution_env.set(param_name, arg_value, param_type)
-        try:
-            await self.executor.execute(task_def['body'], execution_env)
-        except ReturnValue as rv:
-            return rv.value
-        return None
-        
-    def _prepare_expr_string(self, expr, env):
-        self._current_eval_env = env
-        
-        # Use a more specific regex that is less likely to match inside strings
-        # It looks for a variable name that isn't preceded by a quote character.
-        e = re.sub(r"(?<!['\"])(\b\w+'s\s*[\w\']+\b)", lambda m: self._sub_property(m), expr, flags=re.I)
-        e = re.sub(r"\bthis's\s*([\w\']+)\b", lambda m: self._sub_property(m, this_obj=env.get('this')), e, flags=re.I)
-
-        all_vars = {}
-        curr_env = env
-        while curr_env:
-            for k, v in curr_env.values.items():
-                if k not in all_vars: all_vars[k] = v
-            curr_env = curr_env.outer
-            
-        for var in sorted(all_vars.keys(), key=len, reverse=True):
-            e = re.sub(rf'\b{var}\b', lambda m: repr(all_vars.get(m.group(0))), e)
-        
-        replacements = {
-            " is greater than ": " > ", " is less than ": " < ", " is equal to ": " == ",
-            " is not equal to ": " != ", " plus ": " + ", " minus ": " - ",
-            " times ": " * ", " divided by ": " / ", " and ": " and ", " or ": " or ",
-            " is true": " == True", " is false": " == False", " not ": " not "
-        }
-        for word, symbol in replacements.items():
-            e = e.replace(word, symbol)
-        return e
+        scope = calling_env.scope
+        return [bind_expression(arg, scope).evaluate(calling_env) for arg in args]
 
-    async def eval_expr(self, expr, env):
-        stripped_expr = expr.strip()
-        # Directly return a variable if the expression is just its name.
-        if re.fullmatch(r'\w+', stripped_expr):
-            val = env.get(stripped_expr)
-            if val is not None:
-                return val
-
-        # If it's a more complex expression, proceed with processing.
-        processed_expr = self._prepare_expr_string(stripped_expr, env)
-        safe_globals = {"__builtins__": {}, "True": True, "False": False}
-        try:
-            return eval(processed_expr, safe_globals)
-        except TypeError as e:
-            if "can only concatenate str" in str(e):
-                try:
-                    parts = processed_expr.split('+')
-                    resolved_parts = [eval(part.strip(), safe_globals) for part in parts]
-                    return "".join(map(str, resolved_parts))
-                except Exception:
-                    raise e
-            else:
-                raise e
-        except Exception:
-            try:
-                original_expr = stripped_expr
-                first_quote = original_expr.index('"')
-                last_quote = original_expr.rindex('"')
-                if first_quote < last_quote:
-                    return original_expr[first_quote+1:last_quote]
-            except ValueError:
-                pass
-            return stripped_expr.strip("'\"")
-
-    def _sub_property(self, match, this_obj=None):
-        original_text = match.group(0)
-        
-        if this_obj:
-            obj = this_obj
-            path_str = match.group(1)
+    async def call_task(self, task_def, args, execution_env=None, this=None):
+        """Runs a task, or a method when 'this' is given, with arguments that are already values."""
+        params = task_def['params']
+        if len(args) != len(params):
+            raise ValueError(f"Incorrect number of arguments for task. Expected {len(params)}, got {len(args)}.")
+        if task_def.get('is_parallel') and self.parallel and not execution_env:
+            return await self.parallel.call(self, task_def, args)
+        if not execution_env:
+            execution_env = Environment(outer=self.globals_for(task_def), scope=task_def.get('scope'))
+        slots = task_def.get('slots')
+        if slots is None:
+            slots = task_def['slots'] = self._parameter_slots(task_def, this is not None)
+        if slots is not False:
+            # The resolver put 'this' and the parameters first in the task's scope.
+            values = execution_env.slots
+            if this is not None:
+                values[0] = this
+            for slot, value in zip(slots, args):
+                values[slot] = value
         else:
-            obj_name = original_text.split("'s")[0]
-            obj = self._current_eval_env.get(obj_name)
-            if obj is None:
-                return original_text
-            path_str = "'s".join(original_text.split("'s")[1:])
-
-        keys = path_str.strip().split("'s")
-        val = obj
-        for key in keys:
-            key = key.strip().lower()
-
-            if val is None:
-                break
-
-            if key == 'length' and hasattr(val, '__len__'):
-                val = len(val)
-            elif isinstance(val, ObjectInstance):
-                val = val.env.get(key)
-            elif isinstance(val, dict):
-                val = val.get(key)
-            elif hasattr(val, key):
-                prop = getattr(val, key)
-                val = prop() if callable(prop) else prop
-            else:
-                val = None
-                break
-    
-        return repr(val)
+            if this is not None:
+                execution_env.set('this', this, this.class_def.name)
+            for param_def, arg_value in zip(params, args):
+                execution_env.set(param_def['name'], arg_value, param_def['type'])
+        returned = await self.executor.execute(task_def['code'], execution_env)
+        return returned.value if returned is not None else None
+
+    def _parameter_slots(self, task_def, is_method):
+        """The slot of each parameter in the task's scope, or False if they are not laid out in order."""
+        scope = task_def.get('scope')
+        names = (['this'] if is_method else []) + [p['name'] for p in task_def['params']]
+        if scope is None or [scope.names.get(name) for name in names] != list(range(len(names))):
+            return False
+        return tuple(range(1, len(names))) if is_method else tuple(range(len(names)))
+
+    async def eval_expr(self, expr, env):
+        return bind_expression(expr, env.scope).evaluate(env)
@@ -0,0 +1,100 @@
+import asyncio
+
+
+class Module:
+    """
+    A library loaded by 'use the library'. Every importer shares the same Module,
+    so a library's top level runs once and its tasks keep one set of globals.
+    """
+    def __init__(self, path, interpreter):
+        self.path = path
+        self.interpreter = interpreter
+
+    @property
+    def classes(self):
+        return self.interpreter.classes
+
+    @property
+    def tasks(self):
+        return self.interpreter.global_tasks
+
+    @property
+    def global_env(self):
+        return self.interpreter.global_env
+
+    @property
+    def dependencies(self):
+        """Every library path this module pulled in, directly or transitively."""
+        return self.interpreter.dependencies
+
+
+class ModuleRegistry:
+    """Loads each library at most once per process, however many files import it."""
+    def __init__(self):
+        self.modules = {}
+        self._loading = {}
+        self._waits = {}
+
+    async def load(self, path, importer, factory):
+        """
+        Returns the Module for an absolute path, running the file on first use.
+        If that file is itself waiting on 'importer' (a circular import), the partially
+        loaded module is returned instead - or None when the file is the program being
+        run, which is never loaded as a library.
+        """
+        module = self.modules.get(path)
+        if module and path not in self._loading:
+            return module
+        if self._waiting_on(path, importer):
+            return module
+
+        waits = self._waits.setdefault(importer, set())
+        waits.add(path)
+        try:
+            if path in self._loading:
+                return await asyncio.shield(self._loading[path])
+            return await self._run(path, factory)
+        finally:
+            waits.discard(path)
+            if not waits:
+                self._waits.pop(importer, None)
+
+    async def _run(self, path, factory):
+        module = self.modules[path] = Module(path, factory(path))
+        loading = self._loading[path] = asyncio.get_running_loop().create_future()
+        try:
+            await module.interpreter.run_from_file(path)
+        except BaseException as e:
+            del self.modules[path]
+            loading.set_exception(e)
+            loading.exception()  # whoever triggered the import reports the failure
+            raise
+        else:
+            loading.set_result(module)
+        finally:
+            del self._loading[path]
+        return module
+
+    def _waiting_on(self, path, target):
+        """True if loading 'path' is, directly or through other imports, waiting on 'target'."""
+        seen, stack = set(), [path]
+        while stack:
+            current = stack.pop()
+            if current == target:
+                return True
+            if current not in seen:
+                seen.add(current)
+                stack.extend(self._waits.get(current, ()))
+        return False
+
+    def summary(self, path):
+        """The digest of a loaded library's TypeSummary, or None while it is still loading."""
+        module = self.modules.get(path)
+        summary = module.interpreter.summary if module else None
+        return summary.digest if summary else None
+
+    def clear(self):
+        self.modules.clear()
+
+
+registry = ModuleRegistry()
@@ -0,0 +1,122 @@
+import os
+import pickle
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .structures import Environment, UNSET
+
+# In each worker process: the interpreter rebuilt from the last payload it was sent.
+_worker = {}
+
+
+def _snapshot(env):
+    """A global environment's layout plus every value that can cross to another process."""
+    values = {}
+    for slot, value in enumerate(env.slots):
+        if value is UNSET:
+            continue
+        try:
+            values[slot] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            pass  # open files, running tasks and the like stay behind
+    return env.scope, dict(env.types or {}), values
+
+
+def _restore_env(snapshot):
+    scope, types, values = snapshot
+    env = Environment(scope=scope)
+    env.types = types or None
+    for slot, value in values.items():
+        if slot >= len(env.slots):
+            env.slots.extend([UNSET] * (slot + 1 - len(env.slots)))
+        env.slots[slot] = pickle.loads(value)
+    return env
+
+
+def _restore(payload):
+    from .interpreter import HumanLang
+    tasks, classes, main, modules = pickle.loads(payload)
+    interpreter = HumanLang()
+    interpreter.parallel = None  # parallel tasks called from inside a worker just run there
+    interpreter.global_tasks = tasks
+    interpreter.classes = classes
+    interpreter.global_env = _restore_env(main)
+    for snapshot in modules:
+        env = _restore_env(snapshot)
+        interpreter.module_envs[env.scope] = env
+    return interpreter
+
+
+def _run_chunk(digest, payload, task_name, chunk):
+    """Worker entry point: runs one task over a chunk of argument lists."""
+    interpreter = _worker.get(digest)
+    if interpreter is None:
+        _worker.clear()
+        interpreter = _worker[digest] = _restore(payload)
+    task_def = interpreter.global_tasks[task_name]
+
+    async def run():
+        try:
+            return [await interpreter.call_task(task_def, list(args)) for args in chunk]
+        finally:
+            # Each chunk runs on a new event loop, and the HTTP session belongs to this one.
+            await interpreter.http.close()
+    try:
+        return asyncio.run(run())
+    finally:
+        interpreter.files.flush_all()  # the worker lives on, but its appends must be on disk when the call returns
+
+
+class ParallelRunner:
+    """
+    Runs parallel tasks in a pool of worker processes, so CPU-bound HumanLang code
+    can use every core. Each call ships the task definitions, classes and a snapshot
+    of global variables to the workers; only return values come back, so changes a
+    parallel task makes to globals stay in its worker.
+    """
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def pool(self):
+        if self._pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                # Workers fork from a server that has already imported the interpreter.
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['humanlang.core.interpreter'])
+            else:
+                context = multiprocessing.get_context('spawn')
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    def _payload(self, interpreter):
+        modules = [_snapshot(env) for env in interpreter.module_envs.values()]
+        payload = pickle.dumps((interpreter.global_tasks, interpreter.classes,
+                                _snapshot(interpreter.global_env), modules), protocol=pickle.HIGHEST_PROTOCOL)
+        return hashlib.sha256(payload).hexdigest(), payload
+
+    async def map(self, interpreter, task_def, arg_lists):
+        """Calls a global task once per argument list across the pool, returning the results in order."""
+        arg_lists = [list(args) for args in arg_lists]
+        if not arg_lists:
+            return []
+        name = task_def.get('name')
+        if interpreter.global_tasks.get(name) is not task_def:
+            raise TypeError("Only global tasks can run in parallel.")
+        digest, payload = self._payload(interpreter)
+        # A few chunks per worker keeps every core busy without paying per-call overhead.
+        size = max(1, -(-len(arg_lists) // (self.workers * 4)))
+        chunks = [arg_lists[i:i + size] for i in range(0, len(arg_lists), size)]
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(self.pool(), _run_chunk, digest, payload, name, chunk)
+                                         for chunk in chunks))
+        return [result for chunk in results for result in chunk]
+
+    async def call(self, interpreter, task_def, args):
+        return (await self.map(interpreter, task_def, [args]))[0]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
@@ -1,39 +1,140 @@
-import re
+class Statement:
+    """
+    One source line: its text (stripped, without the closing period) and where it
+    came from. Every Instruction compiled from it keeps a reference for errors and
+    profiling, so it stays small: four slots and no per-object dict.
+    """
+    __slots__ = ('text', 'line', 'column', 'file')
+
+    def __init__(self, text, line=0, column=1, file=None):
+        self.text = text
+        self.line = line
+        self.column = column
+        self.file = file
+
+    def location(self):
+        return f"line {self.line} of {self.file}" if self.file else f"line {self.line}"
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"<Statement {self.location()}: {self.text!r}>"
+
+def locate(error, statement):
+    """Records the statement an error came from, unless a more deeply nested one already did."""
+    if getattr(error, 'statement', None) is None:
+        error.statement = statement
+    return error
+
+def describe(error):
+    """An error's message, followed by the statement it came from when that is known."""
+    statement = getattr(error, 'statement', None)
+    if statement is None:
+        return str(error)
+    return f"{error}\n  at {statement.location()}: {statement.text}"
 
-def _starts_block(stripped: str) -> bool:
+class Block(list):
     """
-    Returns True when the line should start a new nested block.
-    Covers sync/async tasks, control-flow, classes, and try blocks.
+    A nested block: element 0 is the head line, the rest is its body. `kind` names
+    the 'End' that closes it ('if', 'task', ...). `scope` is filled in by the
+    resolver for blocks that open a new scope.
     """
-    return (
-        stripped.startswith(('if', 'for', 'while', 'define a class', 'try to')) or
-        re.match(r'define (an|a) (asynchronous )?task', stripped)
-    )
+    __slots__ = ('scope', 'kind')
 
-def parse_code(lines):
-    """Parses lines of code into a nested block structure."""
-    stack = [[]]                      # root list
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.scope = None
+        self.kind = None
 
-    for line in lines:
-        stripped = line.strip().lower()
+# Line kinds the parser cares about; everything else is a plain statement.
+OPEN, SEPARATOR, CLOSE = 'open', 'separator', 'close'
 
-        if _starts_block(stripped):
-            block = [line]            # head line is element 0
-            stack[-1].append(block)   # add to current level
-            stack.append(block)       # descend into the new block
+def _build_keywords():
+    """
+    A trie over the leading words of a line. A node's (kind, name) entry marks
+    where a keyword ends; the parser takes the longest keyword a line starts with.
+    """
+    keywords = {
+        'if': (OPEN, 'if'), 'for': (OPEN, 'for'), 'while': (OPEN, 'while'),
+        'try to': (OPEN, 'try'), 'run a task group': (OPEN, 'group'), 'define a class': (OPEN, 'class'),
+        'else': (SEPARATOR, 'if'), 'otherwise': (SEPARATOR, 'if'), 'on error': (SEPARATOR, 'try'),
+    }
+    for article in ('a', 'an'):
+        for kind in ('', 'asynchronous ', 'parallel '):
+            keywords[f'define {article} {kind}task'] = (OPEN, 'task')
+    for name in ('if', 'for', 'while', 'try', 'group', 'class', 'task'):
+        keywords[f'end {name}'] = (CLOSE, name)
+
+    trie = {}
+    for phrase, entry in keywords.items():
+        node = trie
+        for word in phrase.split():
+            node = node.setdefault(word, {})
+        node[None] = entry
+    return trie, max(len(phrase.split()) for phrase in keywords)
+
+_KEYWORDS, _KEYWORD_DEPTH = _build_keywords()
 
-        # Keywords that belong to an existing block
-        elif stripped.startswith(('else', 'otherwise', 'on error')):
-            stack[-1].append(line)
+def classify(text):
+    """Returns (kind, block name) for a line that opens, splits or closes a block, else None."""
+    # Most lines are plain statements whose first word rules them out straight away.
+    words = text.split(None, 1)
+    node = _KEYWORDS.get(words[0].lower()) if words else None
+    if node is None:
+        return None
+    found = node.get(None)
+    for word in text.lower().split(None, _KEYWORD_DEPTH)[1:_KEYWORD_DEPTH]:
+        node = node.get(word)
+        if node is None:
+            break
+        found = node.get(None, found)
+    return found
 
-        # Keywords that close a block
-        elif stripped.startswith(('end if', 'end for', 'end while',
-                                   'end task', 'end class', 'end try')):
-            if len(stack) > 1:
-                stack.pop()
+def read_statements(path):
+    """Reads a source file one line at a time, yielding a Statement for every non-blank line."""
+    texts = {}  # repeated lines share one string
+    with open(path, 'r') as f:
+        for number, raw in enumerate(f, 1):
+            text = raw.strip()
+            if text:
+                text = text.rstrip('.')
+                column = len(raw) - len(raw.lstrip()) + 1
+                yield Statement(texts.setdefault(text, text), number, column, path)
+
+def parse_code(statements):
+    """
+    Parses Statements into a nested block structure in a single pass. Each line is
+    classified once by its leading keywords, and every 'end' has to close the
+    innermost open block, so mismatched or missing ends are reported where they are.
+    """
+    root = []
+    stack = [root]                    # the innermost open block is last
 
-        # Plain statement
+    for stmt in statements:
+        keyword = classify(stmt.text)
+        if keyword is None:
+            stack[-1].append(stmt)
+            continue
+        kind, name = keyword
+        if kind == OPEN:
+            block = Block([stmt])     # head line is element 0
+            block.kind = name
+            stack[-1].append(block)
+            stack.append(block)
+        elif kind == SEPARATOR:
+            stack[-1].append(stmt)
+        elif len(stack) == 1:
+            raise locate(SyntaxError(f"'{stmt.text}' does not close any open block."), stmt)
+        elif stack[-1].kind != name:
+            opened = stack[-1][0]
+            raise locate(SyntaxError(f"'{stmt.text}' cannot close the '{opened.text}' block opened on "
+                                     f"line {opened.line}; expected 'End {stack[-1].kind}'."), stmt)
         else:
-            stack[-1].append(line)
+            stack.pop()
 
-    return stack[0]
\ No newline at end of file
+    if len(stack) > 1:
+        opened = stack[-1][0]
+        raise locate(SyntaxError(f"The '{opened.text}' block is never closed; expected 'End {stack[-1].kind}'."),
+                     opened)
+    return root
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import contextvars
+from collections import Counter
+from .executor import Executor
+from .parser import locate
+
+# The innermost task or statement being profiled in the running asyncio task.
+_frame = contextvars.ContextVar('humanlang_profile_frame', default=None)
+
+# Statements whose own time is spent blocked on the network, or waiting on other
+# tasks and worker processes, rather than interpreting.
+NETWORK_HANDLERS = {'handle_http_get', 'handle_http_get_all', 'handle_arp_scan', 'handle_ping',
+                    'handle_traceroute', 'handle_port_scan', 'handle_send_packet', 'handle_sniff',
+                    'handle_stream_sniff'}
+WAIT_HANDLERS = {'handle_await_all', 'handle_task_group', 'handle_perform_parallel'}
+
+SORT_KEYS = ('self', 'cumulative', 'calls')
+
+
+class Stats:
+    __slots__ = ('calls', 'cumulative', 'own', 'network', 'task')
+
+    def __init__(self, task=None):
+        self.calls = 0
+        self.cumulative = 0.0
+        self.own = 0.0
+        self.network = 0.0
+        self.task = task
+
+
+class _Frame:
+    __slots__ = ('key', 'label', 'stats', 'parent', 'task', 'kind', 'children', 'started', 'path')
+
+    def __init__(self, key, label, stats, parent, kind):
+        self.key = key
+        self.label = label
+        self.stats = stats
+        self.parent = parent
+        self.kind = kind
+        self.children = 0.0
+        self.path = None
+
+
+class Profiler:
+    """
+    Records, for every statement and every task, how often it ran, its cumulative
+    time (including what it called) and its self time, and splits the program's
+    time into interpreting, network I/O and waiting on other tasks. The results
+    come out as a sorted report or as collapsed stacks for flamegraph tools.
+    """
+    def __init__(self):
+        self.lines = {}  # Instruction -> Stats
+        self.tasks = {}  # task name -> Stats
+        self.stacks = Counter()  # 'task;statement;...' -> self seconds
+        self.totals = {'interpreting': 0.0, 'network': 0.0, 'waiting': 0.0}
+        self.started = None
+        self.elapsed = 0.0
+        self.program = 0.0  # time the main file's top level ran; the rest went on loading
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self):
+        if self.started is not None:
+            self.elapsed += time.perf_counter() - self.started
+            self.started = None
+
+    def enter(self, key, label, stats, kind=None, is_task=False):
+        parent = _frame.get()
+        frame = _Frame(key, label, stats, parent, kind)
+        frame.task = frame if is_task else (parent.task if parent else None)
+        token = _frame.set(frame)
+        frame.started = time.perf_counter()
+        return frame, token
+
+    def leave(self, frame, token):
+        elapsed = time.perf_counter() - frame.started
+        _frame.reset(token)
+        own = max(0.0, elapsed - frame.children)
+        stats = frame.stats
+        stats.calls += 1
+        stats.own += own
+        if not self._recursive(frame):
+            stats.cumulative += elapsed
+        if frame.parent is not None:
+            frame.parent.children += elapsed
+        else:
+            self.program = elapsed  # libraries' top levels finish first, the main file last
+        kind = frame.kind or 'interpreting'
+        self.totals[kind] += own
+        if kind == 'network':
+            stats.network += own
+            if frame.task is not None:
+                frame.task.stats.network += own
+        self.stacks[self._path(frame)] += own
+
+    def _recursive(self, frame):
+        """Whether the same task or statement is already running further up, so its time is counted there."""
+        parent = frame.parent
+        while parent is not None:
+            if parent.key is frame.key:
+                return True
+            parent = parent.parent
+        return False
+
+    def _path(self, frame):
+        if frame.path is None:
+            label = frame.label.replace(';', ',')
+            frame.path = f"{self._path(frame.parent)};{label}" if frame.parent else label
+        return frame.path
+
+    def line_stats(self, ins, task):
+        stats = self.lines.get(ins)
+        if stats is None:
+            stats = self.lines[ins] = Stats(task)
+        return stats
+
+    def task_stats(self, name):
+        stats = self.tasks.get(name)
+        if stats is None:
+            stats = self.tasks[name] = Stats(name)
+        return stats
+
+    def report(self, sort='self', limit=25):
+        """The profile as lines of text: totals, then tasks and statements sorted by 'sort'."""
+        key = {'self': lambda s: s.own, 'cumulative': lambda s: s.cumulative, 'calls': lambda s: s.calls}[sort]
+        total = max(self.elapsed, self.program)
+        lines = [f"Profile: {total:.3f}s total, {total - self.program:.3f}s loading and compiling, "
+                 f"{self.totals['interpreting']:.3f}s interpreting, {self.totals['network']:.3f}s network I/O, "
+                 f"{self.totals['waiting']:.3f}s waiting on tasks",
+                 '',
+                 f"{'calls':>9} {'cumulative':>11} {'self':>9} {'network':>9}  task"]
+        for name, stats in sorted(self.tasks.items(), key=lambda kv: key(kv[1]), reverse=True)[:limit]:
+            lines.append(f"{stats.calls:>9} {stats.cumulative:>10.4f}s {stats.own:>8.4f}s {stats.network:>8.4f}s  {name}")
+        lines += ['', f"{'calls':>9} {'cumulative':>11} {'self':>9} {'network':>9}  {'line':<20} statement"]
+        for ins, stats in sorted(self.lines.items(), key=lambda kv: key(kv[1]), reverse=True)[:limit]:
+            text = ins.text if len(ins.text) <= 60 else ins.text[:57] + '...'
+            lines.append(f"{stats.calls:>9} {stats.cumulative:>10.4f}s {stats.own:>8.4f}s {stats.network:>8.4f}s  "
+                         f"{self._where(ins):<20} {text}  [{stats.task}]")
+        return lines
+
+    def _where(self, ins):
+        source = ins.source
+        if source is None or not source.line:
+            return ''
+        return f"{os.path.basename(source.file)}:{source.line}" if source.file else str(source.line)
+
+    def write_collapsed(self, path):
+        """Writes 'frame;frame;... microseconds' lines, the input format of flamegraph.pl and speedscope."""
+        with open(path, 'w') as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                micros = round(seconds * 1e6)
+                if micros:
+                    f.write(f"{stack} {micros}\n")
+
+    def print_report(self, sort='self', limit=25, file=None):
+        print('\n'.join(self.report(sort, limit)), file=file or sys.stderr)
+
+
+class ProfilingExecutor(Executor):
+    """
+    An Executor that times every statement and task call for a Profiler. It is
+    only installed when profiling is asked for, so normal runs pay nothing.
+    """
+    def __init__(self, interpreter, profiler):
+        super().__init__(interpreter)
+        self.profiler = profiler
+        self._task_names = None
+
+    def task_names(self):
+        """Maps each compiled task and method body to its name, to tell task calls from nested blocks."""
+        if self._task_names is None:
+            names = {id(t['code']): name for name, t in self.interpreter.global_tasks.items() if 'code' in t}
+            for class_def in self.interpreter.classes.values():
+                for name, method in class_def.methods.items():
+                    if 'code' in method:
+                        names[id(method['code'])] = f"{class_def.name}.{name}"
+            self._task_names = names
+        return self._task_names
+
+    async def execute(self, code, env):
+        name = self.task_names().get(id(code))
+        if name is None and _frame.get() is None:
+            # The top level of a file counts as a task named after the file.
+            path = self.interpreter.path
+            name = os.path.basename(path) if path else '<main>'
+        if name is None:
+            return await self._execute(code, env, _frame.get().task)
+        profiler = self.profiler
+        frame, token = profiler.enter(name, name, profiler.task_stats(name), is_task=True)
+        try:
+            return await self._execute(code, env, frame)
+        finally:
+            profiler.leave(frame, token)
+
+    async def _execute(self, code, env, task):
+        profiler = self.profiler
+        task_name = task.label if task else None
+        for ins in code:
+            handler = ins.op.__name__
+            kind = 'network' if handler in NETWORK_HANDLERS else 'waiting' if handler in WAIT_HANDLERS else None
+            frame, token = profiler.enter(ins, ins.text, profiler.line_stats(ins, task_name), kind)
+            try:
+                if ins.is_async:
+                    returned = await ins.op(self, ins, env)
+                else:
+                    returned = ins.op(self, ins, env)
+            except Exception as e:
+                raise locate(e, ins.source)
+            finally:
+                profiler.leave(frame, token)
+            if returned is not None:
+                return returned
@@ -0,0 +1,92 @@
+import re
+import sys
+from .structures import Scope
+
+_ASSIGN_RE = re.compile(r'(?:set (\w+) to |declare (\w+) as )', re.I)
+_FOR_RE = re.compile(r'for each (\w+) in ', re.I)
+# Statements that always create their target in the scope they run in.
+_DEFINE_RES = [
+    (('perform', 'read the file', 'read the packets', 'parse the json string', 'send packet', 'start sniffing',
+      'count the packets', 'sum the bytes', 'find the top', 'get the task statistics', 'run a task group',
+      'get item'),
+     re.compile(r'.*\bstore\b.*?\bin (\w+)$', re.I)),
+    (('create a new',), re.compile(r'.*\bcall it (\w+)$', re.I)),
+    (('ask',), re.compile(r'.*\bset the answer to (\w+)$', re.I)),
+]
+
+class Resolver:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def resolve(self, blocks, scope):
+        """
+        Gives every variable a fixed slot in the scope that owns it.
+        Runs after type checking, so the top level is resolved first and the
+        tasks and methods see all of its globals.
+        """
+        self.resolve_body(blocks, scope)
+        for task_def, is_method in self.interpreter.task_definitions():
+            self.resolve_task(task_def, scope, is_method)
+
+    def resolve_task(self, task_def, outer, is_method=False):
+        if 'scope' in task_def:  # Already resolved, e.g. by the library that defined it.
+            return
+        scope = Scope(outer)
+        if is_method:
+            scope.define('this')
+        for param in task_def['params']:
+            scope.define(sys.intern(param['name']))
+        task_def['scope'] = scope
+        self.resolve_body(task_def['body'], scope)
+
+    def resolve_body(self, body, scope):
+        for stmt in body:
+            if isinstance(stmt, list):
+                self.resolve_block(stmt, scope)
+            else:
+                self.resolve_line(stmt, scope)
+
+    def resolve_block(self, block, scope):
+        head = block[0].text.lower()
+        if head.startswith(('define a class', 'define a task', 'define an asynchronous task', 'define a parallel task')):
+            return
+        if head.startswith('for each'):
+            match = _FOR_RE.match(block[0].text)
+            block.scope = Scope(scope)
+            if match:
+                block.scope.define(sys.intern(match.group(1)))
+            self.resolve_body(block[1:], block.scope)
+        elif head.startswith('try to'):
+            # The 'on error' part runs in its own scope holding error_message.
+            block.scope = Scope(scope)
+            block.scope.define('error_message')
+            body_scope = scope
+            for stmt in block[1:]:
+                if not isinstance(stmt, list) and stmt.text.lower() == 'on error':
+                    body_scope = block.scope
+                elif isinstance(stmt, list):
+                    self.resolve_block(stmt, body_scope)
+                else:
+                    self.resolve_line(stmt, body_scope)
+        elif head.startswith('run a task group'):
+            self.resolve_line(block[0], scope)  # the head may store the group's results
+            self.resolve_body(block[1:], scope)
+        else:
+            self.resolve_body(block[1:], scope)
+
+    def resolve_line(self, stmt, scope):
+        line = stmt.text
+        match = _ASSIGN_RE.match(line)
+        if match:
+            # 'set' updates an existing variable and only creates a local one otherwise.
+            name = match.group(1) or match.group(2)
+            if scope.resolve(name) is None:
+                scope.define(sys.intern(name))
+            return
+        lowered = line.lower()
+        for prefixes, pattern in _DEFINE_RES:
+            if lowered.startswith(prefixes):
+                match = pattern.match(line)
+                if match:
+                    scope.define(sys.intern(match.group(1)))
+                return
@@ -0,0 +1,249 @@
+import abc
+import time
+import asyncio
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+OPEN, CLOSED, FILTERED = "Open", "Closed", "Filtered"
+
+
+def parse_ports(spec):
+    """Turns "22,80,8000-8100" (or a number, or a list of either) into an ordered list of ports."""
+    if isinstance(spec, int):
+        return [spec]
+    if isinstance(spec, (list, tuple, range)):
+        parts = spec
+    else:
+        parts = str(spec).split(',')
+    ports = []
+    for part in parts:
+        if isinstance(part, int):
+            ports.append(part)
+            continue
+        part = str(part).strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = map(int, part.split('-', 1))
+            ports.extend(range(start, end + 1))
+        else:
+            ports.append(int(part))
+    for port in ports:
+        if not 0 < port < 65536:
+            raise ValueError(f"Invalid port number: {port}")
+    return ports
+
+
+def expand_hosts(target):
+    """
+    Returns the list of hosts a target names, or None for a single plain host.
+    A target may be a CIDR ("10.0.0.0/24"), or a list of hosts, CIDRs and
+    ARP scan entries (objects with an 'ip').
+    """
+    if isinstance(target, str):
+        if '/' not in target:
+            return None
+        network = ipaddress.ip_network(target.strip(), strict=False)
+        return [str(ip) for ip in network.hosts()] or [str(network.network_address)]
+    if isinstance(target, dict):
+        target = [target]
+    hosts = []
+    for item in target:
+        if isinstance(item, dict):
+            item = item.get('ip')
+        if item is None:
+            continue
+        hosts.extend(expand_hosts(str(item)) or [str(item)])
+    return list(dict.fromkeys(hosts))
+
+
+async def probe_hosts(hosts, probe, workers=32):
+    """
+    Runs the blocking probe(host) for every host, at most 'workers' at a time,
+    and returns {host: result} in the order the hosts were given.
+    """
+    if not hosts:
+        return {}
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(hosts)), thread_name_prefix='humanlang-probe')
+    try:
+        results = await asyncio.gather(*(loop.run_in_executor(pool, probe, host) for host in hosts))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return dict(zip(hosts, results))
+
+
+class PacketLayer(abc.ABC):
+    """
+    What the scanner needs from the network: probe one host on a batch of ports
+    and say what state each port is in. Calls are blocking and run in a thread.
+    """
+    @abc.abstractmethod
+    def syn_probe(self, host, ports, timeout):
+        """Returns {port: OPEN, CLOSED or FILTERED} for every port in 'ports'."""
+
+
+class ScapyPacketLayer(PacketLayer):
+    """Sends real TCP SYN probes through scapy (usually needs root)."""
+    def syn_probe(self, host, ports, timeout):
+        from scapy.all import IP, TCP, sr
+        try:
+            ans, unans = sr(IP(dst=host)/TCP(dport=list(ports), flags="S"), timeout=timeout, verbose=False)
+        except PermissionError:
+            raise PermissionError("Port scans require root/administrator privileges.")
+        states = {}
+        for sent, received in ans:
+            flags = received[TCP].flags if received.haslayer(TCP) else 0
+            if flags == 0x12:
+                states[sent[TCP].dport] = OPEN
+            elif flags == 0x14:
+                states[sent[TCP].dport] = CLOSED
+            else:
+                states[sent[TCP].dport] = FILTERED
+        for sent in unans:
+            states[sent[TCP].dport] = FILTERED
+        return states
+
+
+class FakePacketLayer(PacketLayer):
+    """
+    An offline stand-in for benchmarks and experiments: answers every probe after
+    'latency' seconds, reporting 'open_ports' as open, 'filtered_ports' as filtered
+    and everything else as closed. Keeps counts of what it was asked to send.
+    """
+    def __init__(self, open_ports=(), filtered_ports=(), latency=0.0):
+        self.open_ports = set(open_ports)
+        self.filtered_ports = set(filtered_ports)
+        self.latency = latency
+        self.probes_sent = 0
+        self.batches = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def syn_probe(self, host, ports, timeout):
+        with self._lock:
+            self.batches += 1
+            self.probes_sent += len(ports)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return {port: OPEN if port in self.open_ports else FILTERED if port in self.filtered_ports else CLOSED
+                    for port in ports}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class RateLimiter:
+    """A token bucket allowing 'rate' packets per second, in bursts of up to 'burst'."""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, count=1):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # A request bigger than the bucket waits for a full bucket and overdraws it.
+                if self.tokens >= min(count, self.burst):
+                    self.tokens -= count
+                    return
+                await asyncio.sleep((min(count, self.burst) - self.tokens) / self.rate)
+
+
+class PortScanner:
+    """
+    Splits a scan into (host, batch of ports) probes and runs up to 'window' of them
+    at once, optionally capped at 'rate' packets per second. Each finished batch is
+    written straight into the results dict, so a scan running in the background can
+    be read while it is still going.
+    """
+    def __init__(self, layer=None, batch_size=256, window=8, rate=None, timeout=2):
+        self.layer = layer or ScapyPacketLayer()
+        self.batch_size = batch_size
+        self.window = window
+        self.rate = rate
+        self.timeout = timeout
+        self._pool = None
+        self._pool_size = 0
+
+    def _executor(self):
+        # The default to_thread pool is sized for CPU work; probes mostly wait on the wire.
+        if self._pool is None or self._pool_size < self.window:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)  # a scan still using it finishes its probes first
+            self._pool = ThreadPoolExecutor(max_workers=self.window, thread_name_prefix='humanlang-scan')
+            self._pool_size = self.window
+        return self._pool
+
+    def batches(self, hosts, ports, rate=None):
+        size = self.batch_size
+        if rate:
+            # Never ask the rate limiter for more than a second's worth of packets at once.
+            size = max(1, min(size, int(rate)))
+        # Round-robin over hosts so every host progresses at once and none is hammered.
+        for i in range(0, len(ports), size):
+            for host in hosts:
+                yield host, ports[i:i + size]
+
+    async def scan(self, hosts, ports, results=None, rate=None):
+        """
+        Scans every port on every host. 'results' maps port to state for a single
+        host (a plain string), or host to such a dict for a list of hosts.
+        """
+        single = isinstance(hosts, str)
+        hosts = [hosts] if single else list(hosts)
+        ports = parse_ports(ports)
+        results = {} if results is None else results
+        if not single:
+            for host in hosts:
+                results.setdefault(host, {})
+        rate = rate or self.rate
+        limiter = RateLimiter(rate) if rate else None
+        window = asyncio.Semaphore(self.window)
+        loop, pool = asyncio.get_running_loop(), self._executor()
+        errors, pending = [], set()
+
+        async def run(host, batch):
+            try:
+                states = await loop.run_in_executor(pool, self.layer.syn_probe, host, batch, self.timeout)
+            except Exception as e:
+                errors.append(e)
+                return
+            finally:
+                window.release()
+            (results if single else results[host]).update(states)
+
+        try:
+            for host, batch in self.batches(hosts, ports, rate):
+                await window.acquire()
+                if errors:
+                    window.release()
+                    break
+                if limiter:
+                    try:
+                        await limiter.acquire(len(batch))
+                    except BaseException:
+                        window.release()
+                        raise
+                task = asyncio.create_task(run(host, batch))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+
+# The task group whose body is running; tasks started inside it (even from other
+# tasks in the group) join it instead of the loose 'running_tasks' list.
+_current_group = contextvars.ContextVar('humanlang_task_group', default=None)
+
+
+def current_group():
+    return _current_group.get()
+
+
+class Scheduler:
+    """
+    Starts every asynchronous task an interpreter runs, and counts them: how many
+    are queued behind a concurrency limit, running, completed or failed.
+    """
+    def __init__(self):
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.tasks = set()  # queued and running
+
+    def stats(self):
+        return {'queued': self.queued, 'running': self.running,
+                'completed': self.completed, 'failed': self.failed}
+
+    def spawn(self, coro, semaphore=None):
+        """Runs a coroutine as a task, waiting for a slot on the semaphore first if one is given."""
+        self.queued += 1
+
+        async def run():
+            try:
+                if semaphore is not None:
+                    await semaphore.acquire()
+            except BaseException:
+                self.queued -= 1
+                coro.close()
+                raise
+            self.queued -= 1
+            self.running += 1
+            try:
+                result = await coro
+            except asyncio.CancelledError:
+                raise
+            except BaseException:
+                self.failed += 1
+                raise
+            else:
+                self.completed += 1
+                return result
+            finally:
+                self.running -= 1
+                if semaphore is not None:
+                    semaphore.release()
+        task = asyncio.create_task(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def cancel_all(self):
+        """Cancels every task still queued or running, e.g. ones a finished script never awaited."""
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def wait_all(tasks, timeout=None):
+    """
+    Waits for every task (including ones added to the list while waiting) and
+    returns their results in order. The first failure, or running past the timeout,
+    cancels whatever is still going and is raised.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    try:
+        while True:
+            pending = [task for task in tasks if not task.done()]
+            failed = next((task for task in tasks if task.done() and not task.cancelled() and task.exception()), None)
+            if failed:
+                raise failed.exception()
+            if not pending:
+                break
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"The tasks did not finish within {timeout} seconds.")
+            await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_EXCEPTION)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return [None if task.cancelled() else task.result() for task in tasks]
+
+
+class TaskGroup:
+    """
+    A block of asynchronous tasks that runs at most 'limit' at a time, finishes
+    within 'timeout' seconds, and stops every task as soon as one fails.
+    """
+    def __init__(self, scheduler, limit=None, timeout=None):
+        self.scheduler = scheduler
+        self.semaphore = asyncio.Semaphore(int(limit)) if limit else None
+        self.timeout = timeout
+        self.tasks = []
+        self.returned = None  # whatever the body returned, e.g. a 'return' statement's value
+
+    def spawn(self, coro):
+        task = self.scheduler.spawn(coro, self.semaphore)
+        self.tasks.append(task)
+        return task
+
+    async def run(self, body):
+        """Runs the group's body, then waits for every task it started; returns their results in start order."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        token = _current_group.set(self)
+        try:
+            self.returned = await body()
+        except BaseException:
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            raise
+        finally:
+            _current_group.reset(token)
+        # The timeout covers the whole group, body included.
+        remaining = None if self.timeout is None else max(0, self.timeout - (loop.time() - started))
+        try:
+            return await wait_all(self.tasks, remaining)
+        except TimeoutError:
+            raise TimeoutError(f"The task group did not finish within {self.timeout} seconds.") from None
@@ -1,39 +1,151 @@
 
+import asyncio
+
 class TypeSystemError(Exception): pass
-class ReturnValue(Exception):
+class ReturnValue:
+    """What a 'return' hands back through the blocks it is nested in, up to the task that was called."""
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
 
-class Environment:
+# Marks a slot whose variable has not been assigned yet.
+UNSET = object()
+
+class Scope:
+    """
+    The static layout of one lexical scope: the slot index of every variable it owns.
+    Scopes are shared by every Environment created for the same block. They memoize
+    the (depth, slot) address of each name and the expressions bound to those addresses.
+    """
+    generation = 0
+    __slots__ = ('outer', 'names', 'addresses', 'expressions', 'seen', 'resolved')
+
     def __init__(self, outer=None):
         self.outer = outer
-        self.values = {}
-        self.types = {}
+        self.names = {}
+        self.addresses = {}
+        self.expressions = {}
+        self.seen = Scope.generation
+        self.resolved = False
 
-    def get(self, name):
-        if name in self.values: return self.values[name]
-        if self.outer: return self.outer.get(name)
+    def __getstate__(self):
+        # Memoized addresses and bound expressions are rebuilt on demand after loading.
+        return (self.outer, self.names)
+
+    def __setstate__(self, state):
+        self.outer, self.names = state
+        self.addresses = {}
+        self.expressions = {}
+        self.seen = Scope.generation
+        self.resolved = False
+
+    def define(self, name):
+        slot = self.names.get(name)
+        if slot is None:
+            slot = self.names[name] = len(self.names)
+            # A new name can shadow one that inner scopes already resolved past this one.
+            if self.resolved: Scope.generation += 1
+        return slot
+
+    def check_generation(self):
+        if self.seen != Scope.generation:
+            self.addresses.clear()
+            self.expressions.clear()
+            self.seen = Scope.generation
+
+    def resolve(self, name):
+        self.check_generation()
+        if name in self.addresses: return self.addresses[name]
+        address, depth, scope = None, 0, self
+        while scope:
+            scope.resolved = True
+            slot = scope.names.get(name)
+            if slot is not None:
+                address = (depth, slot, scope)
+                break
+            scope, depth = scope.outer, depth + 1
+        self.addresses[name] = address
+        return address
+
+class Environment:
+    __slots__ = ('outer', 'scope', 'slots', 'types')
+
+    def __init__(self, outer=None, scope=None):
+        self.outer = outer
+        self.scope = scope or Scope(outer.scope if outer else None)
+        self.slots = [UNSET] * len(self.scope.names)
+        self.types = None
+
+    def _locate(self, name):
+        # Follows the resolved address; None if the runtime chain differs from the static one.
+        address = self.scope.resolve(name)
+        if address is None: return None
+        depth, slot, owner = address
+        env = self
+        while depth and env:
+            env, depth = env.outer, depth - 1
+        if env is None or env.scope is not owner: return None
+        if slot >= len(env.slots):
+            env.slots.extend([UNSET] * (slot + 1 - len(env.slots)))
+        return env, slot
+
+    def _search(self, name):
+        env = self
+        while env:
+            slot = env.scope.names.get(name)
+            if slot is not None and slot < len(env.slots) and env.slots[slot] is not UNSET:
+                return env, slot
+            env = env.outer
         return None
 
+    def _read(self, name):
+        located = self._locate(name)
+        if located:
+            env, slot = located
+            value = env.slots[slot]
+            if value is not UNSET: return value
+        located = self._search(name)
+        return located[0].slots[located[1]] if located else UNSET
+
+    def get(self, name):
+        value = self._read(name)
+        return None if value is UNSET else value
+
+    def lookup(self, name):
+        value = self._read(name)
+        if value is UNSET: raise NameError(f"Variable '{name}' is not defined.")
+        return value
+
     def get_type(self, name):
-        if name in self.types: return self.types[name]
+        if self.types and name in self.types: return self.types[name]
         if self.outer: return self.outer.get_type(name)
         return "any"
 
     def set(self, name, value, var_type="any"):
-        self.values[name] = value
-        if var_type != "any": self.types[name] = var_type
+        slot = self.scope.define(name)
+        if slot >= len(self.slots):
+            self.slots.extend([UNSET] * (slot + 1 - len(self.slots)))
+        self.slots[slot] = value
+        if var_type != "any":
+            if self.types is None: self.types = {}
+            self.types[name] = var_type
 
     def declare(self, name, var_type):
+        if self.types is None: self.types = {}
         if name in self.types: raise TypeSystemError(f"Variable '{name}' has already been declared.")
         self.types[name] = var_type
+
     def update(self, name, value):
-        if name in self.values:
-            self.values[name] = value
-            return True
-        if self.outer:
-            return self.outer.update(name, value)
-        return False
+        # Only a variable that holds a value is updated; a slot still UNSET, such as a
+        # global assigned later in the file, leaves the value to the local scope.
+        located = self._locate(name)
+        if located is None or located[0].slots[located[1]] is UNSET:
+            located = self._search(name)
+        if not located: return False
+        env, slot = located
+        env.slots[slot] = value
+        return True
 
 
 class ClassDefinition:
@@ -42,13 +154,107 @@ class ClassDefinition:
         self.parent = parent
         self.methods = {}
         self.properties = {}
+        self.layout = None          # property name -> slot index, inherited properties first
+        self.property_types = None  # every property's declared type, inherited ones included
+        self.method_table = None    # every method, inherited ones included
+
+    def finalize(self):
+        """Fixes the slot layout and flattens the method table once the class is fully defined."""
+        parent = self.parent
+        if parent is not None and parent.layout is None:
+            parent.finalize()
+        self.layout = dict(parent.layout) if parent else {}
+        self.property_types = dict(parent.property_types) if parent else {}
+        for name, prop_type in self.properties.items():
+            if name not in self.layout:
+                self.layout[name] = len(self.layout)
+            self.property_types[name] = prop_type
+        self.method_table = dict(parent.method_table) if parent else {}
+        self.method_table.update(self.methods)
+        return self
 
     def find_method(self, name):
-        if name in self.methods: return self.methods[name]
-        if self.parent: return self.parent.find_method(name)
-        return None
+        table = self.method_table if self.method_table is not None else self.finalize().method_table
+        return table.get(name)
 
 class ObjectInstance:
+    """
+    An object: one slot per property in its class's layout, and a dict (only
+    created when needed) for properties the class never declared.
+    """
+    __slots__ = ('class_def', 'values', 'extra')
+
     def __init__(self, class_def):
+        if class_def.layout is None:
+            class_def.finalize()
         self.class_def = class_def
-        self.env = Environment()
+        self.values = [None] * len(class_def.layout)
+        self.extra = None
+
+    def get(self, name):
+        slot = self.class_def.layout.get(name)
+        if slot is not None:
+            return self.values[slot]
+        return self.extra.get(name) if self.extra else None
+
+    def set(self, name, value):
+        slot = self.class_def.layout.get(name)
+        if slot is not None:
+            self.values[slot] = value
+        else:
+            if self.extra is None: self.extra = {}
+            self.extra[name] = value
+
+class StringBuilder:
+    """
+    Text built up one piece at a time. Appending only stores the piece; the pieces
+    are joined once, when the text is shown, written or combined with other text,
+    so building a report of any size costs time in proportion to its length.
+    """
+    __slots__ = ('parts', 'length')
+
+    def __init__(self):
+        self.parts = []
+        self.length = 0
+
+    def append(self, value):
+        text = value if isinstance(value, str) else str(value)
+        self.parts.append(text)
+        self.length += len(text)
+
+    def __str__(self):
+        if len(self.parts) > 1:
+            self.parts = [''.join(self.parts)]  # later appends start from the joined text
+        return self.parts[0] if self.parts else ''
+
+    def __len__(self):
+        return self.length
+
+    def __add__(self, other):
+        return f"{self}{other}"
+
+    def __radd__(self, other):
+        return f"{other}{self}"
+
+    def __repr__(self):
+        return repr(str(self))
+
+class Instruction:
+    """
+    A statement decoded once at compile time: its handler, the regex captures it
+    needs, and the source Statement it came from (for errors and profiling).
+    """
+    __slots__ = ('op', 'args', 'source', 'body', 'orelse', 'scope', 'is_async')
+
+    def __init__(self, op, args=(), source=None, body=None, orelse=None, scope=None):
+        self.op = op
+        self.args = args
+        self.source = source
+        self.body = body
+        self.orelse = orelse
+        self.scope = scope
+        self.is_async = asyncio.iscoroutinefunction(op)
+
+    @property
+    def text(self):
+        return self.source.text if self.source is not None else ''
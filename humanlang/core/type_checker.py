@@ -1,26 +1,103 @@
 import re
+import hashlib
 from .structures import TypeSystemError, Environment
+from .parser import locate
+
+# Types the interpreter provides that 'create a new' accepts besides the script's classes.
+_BUILTIN_CLASSES = ('Packet', 'StringBuilder')
+_LIST_TYPE_RE = re.compile(r'List(?: of (\w+))?$', re.I)
+# Built-in types whose only known property is their length.
+_SIZED_TYPES = ('String', 'StringBuilder', 'Object')
+
+def _element_type(type_name):
+    """The type of a list's items: X for a 'List of X', otherwise 'any'."""
+    match = _LIST_TYPE_RE.match(type_name)
+    return match.group(1) if match and match.group(1) else "any"
+
+class TypeSummary:
+    """
+    What checking code against a file depends on: the declared types of its global
+    variables and the signatures of the tasks and classes it can see. Two summaries
+    with the same digest check every task body the same way.
+    """
+    __slots__ = ('globals', 'tasks', 'classes', 'digest')
+
+    def __init__(self, globals, tasks, classes):
+        self.globals = globals  # name -> declared type
+        self.tasks = tasks      # name -> ((parameter, type), ...), return type, is_async, is_parallel
+        self.classes = classes  # name -> parent name, property types, method signatures
+        self.digest = hashlib.sha256(repr((sorted(globals.items()), sorted(tasks.items()),
+                                           sorted(classes.items()))).encode()).hexdigest()
+
+
+def _signature(task_def):
+    return (tuple((p['name'], p['type']) for p in task_def['params']), task_def.get('returns', 'any'),
+            task_def.get('is_async', False), task_def.get('is_parallel', False))
+
 
 class TypeChecker:
     def __init__(self, interpreter):
         self.interpreter = interpreter
 
+    def summary(self, env):
+        """The TypeSummary of the program as checked so far."""
+        tasks = {name: _signature(t) for name, t in self.interpreter.global_tasks.items()}
+        classes = {name: (c.parent.name if c.parent else None, tuple(sorted(c.property_types.items())),
+                          tuple(sorted((m, _signature(t)) for m, t in c.method_table.items())))
+                   for name, c in self.interpreter.classes.items()}
+        return TypeSummary(dict(env.types or {}), tasks, classes)
+
+    def check_tasks(self, env, verified=frozenset()):
+        """
+        Checks the body of every task and method this file defines, except those in
+        'verified': the keys of bodies that passed against an identical summary.
+        Returns the keys of every body now known to pass.
+        """
+        checked = set()
+        owners = [(name, c.methods) for name, c in self.interpreter.classes.items()]
+        methods = {t.get('digest') for _, tasks in owners for t in tasks.values()}
+        owners.insert(0, (None, self.interpreter.global_tasks))
+        for class_name, tasks in owners:
+            for name, task_def in tasks.items():
+                if 'body' not in task_def:  # compiled already, by the library that defined it
+                    continue
+                if class_name is None and task_def['digest'] in methods:
+                    continue  # a method's copy in the global tasks; checked with its class
+                key = (class_name, name, task_def['digest'])
+                if key not in verified:
+                    task_env = Environment(outer=env)
+                    if class_name:
+                        task_env.declare('this', class_name)
+                    for param in task_def['params']:
+                        task_env.declare(param['name'], param['type'])
+                    self.check(task_def['body'], task_env)
+                checked.add(key)
+        return checked
+
     def check(self, blocks, env):
 
         #Recursively traverses the code blocks to perform type checking.
 
         for stmt in blocks:
             if isinstance(stmt, list):
-                head = stmt[0].lower().strip()
-                if head.startswith('if'):
-                    self.check_if(stmt, env)
-                elif head.startswith('while'):
-                    self.check_while(stmt, env)
-                elif head.startswith('for each'):
-                    self.check_for(stmt, env)
-                # Class and task definitions are checked via their usage, not directly here.
+                head = stmt[0].text.lower()
+                try:
+                    if head.startswith('if'):
+                        self.check_if(stmt, env)
+                    elif head.startswith('while'):
+                        self.check_while(stmt, env)
+                    elif head.startswith('for each'):
+                        self.check_for(stmt, env)
+                    elif head.startswith(('run a task group', 'try to')):
+                        self.check(stmt[1:], env)
+                    # Task and method bodies are checked on their own, by check_tasks.
+                except TypeSystemError as e:
+                    raise locate(e, stmt[0])
             else:
-                self.check_line(stmt, env)
+                try:
+                    self.check_line(stmt.text, env)
+                except TypeSystemError as e:
+                    raise locate(e, stmt)
 
     def check_line(self, line, env):
 
@@ -32,7 +109,7 @@ class TypeChecker:
             return
 
         if line.lower().startswith("declare"):
-            match = re.match(r'declare (\w+) as a (.+)', line, re.I)
+            match = re.match(r'declare (\w+) as an? (.+)', line, re.I)
             if not match:
                 raise TypeSystemError(f"Invalid declaration syntax: '{line}'")
             var, type_name = match.groups()
@@ -46,11 +123,41 @@ class TypeChecker:
             # the existence and return type of the task.
             self.get_expression_type(line, env)
         
+        elif line.lower().startswith("append"):
+            match = re.match(r'append (.+) to (\w+)$', line, re.I)
+            if match:
+                expr, name = match.groups()
+                target_type = env.get_type(name)
+                if _LIST_TYPE_RE.match(target_type):
+                    self.check_item(expr, target_type, name, env)
+                elif target_type not in ("StringBuilder", "any"):
+                    raise TypeSystemError(f"Cannot append to '{name}' of type '{target_type}'.")
+
+        elif line.lower().startswith("get item"):
+            match = re.match(r'get item (.+?) of (.+?) and store (?:it|the result) in (\w+)$', line, re.I)
+            if match:
+                _, name, var = match.groups()
+                item_type = _element_type(self.collection_type(name, env, "get an item of"))
+                expected_type = env.get_type(var)
+                if item_type != "any" and expected_type not in ("any", item_type):
+                    raise TypeSystemError(f"Cannot store an item of type '{item_type}' in variable '{var}' "
+                                          f"of type '{expected_type}'.")
+
+        elif line.lower().startswith("remove"):
+            match = re.match(r'remove (?:item )?(.+) from (.+)', line, re.I)
+            if match:
+                self.collection_type(match.group(2), env, "remove from")
+
+        elif line.lower().startswith("sort"):
+            match = re.match(r'sort (.+?)(?: by \w+)?(?: in descending order)?$', line, re.I)
+            if match:
+                self.collection_type(match.group(1), env, "sort", objects=False)
+
         elif line.lower().startswith("create a new"):
             # Checks if the class exists.
             match = re.match(r'create a new "([^"]+)"', line, re.I)
             class_name = match.group(1)
-            if class_name not in self.interpreter.classes:
+            if class_name not in self.interpreter.classes and class_name not in _BUILTIN_CLASSES:
                 raise TypeSystemError(f"Attempted to create an instance of an unknown class '{class_name}'.")
 
 
@@ -58,6 +165,14 @@ class TypeChecker:
 
         #Ensures that a variable or property assignment is type-safe.
 
+        item_match = re.match(r'set (?:item|key) (?!to\b)(.+?) of (.+?) to (.+)', line, re.I)
+        if item_match:
+            _, name, expr = item_match.groups()
+            container_type = self.collection_type(name, env, "set an item of")
+            if _LIST_TYPE_RE.match(container_type):
+                self.check_item(expr, container_type, name, env)
+            return
+
         prop_match = re.match(r"set (\w+)'s (\w+) to (.+)", line, re.I)
         this_match = re.match(r"set this's (\w+) to (.+)", line, re.I)
         var_match = re.match(r'set (\w+) to (.+)', line, re.I)
@@ -66,11 +181,12 @@ class TypeChecker:
             obj_name, prop, expr = prop_match.groups()
             obj_type_name = self.get_expression_type(obj_name, env)
             class_def = self.interpreter.classes.get(obj_type_name)
-
+            if not class_def and obj_type_name in ("any",) + _BUILTIN_CLASSES:
+                return  # an untyped variable, or a packet: its fields are only known at run time
             if not class_def:
                 raise TypeSystemError(f"Cannot set property on a non-class variable '{obj_name}' of type '{obj_type_name}'.")
             
-            expected_type = class_def.properties.get(prop)
+            expected_type = class_def.property_types.get(prop)
             if not expected_type:
                 raise TypeSystemError(f"Class '{obj_type_name}' has no declared property named '{prop}'.")
             
@@ -85,7 +201,7 @@ class TypeChecker:
             if not class_def:
                 raise TypeSystemError("'this' can only be used inside a class method.")
 
-            expected_type = class_def.properties.get(prop)
+            expected_type = class_def.property_types.get(prop)
             if not expected_type:
                 raise TypeSystemError(f"Class '{this_type_name}' has no declared property named '{prop}'.")
 
@@ -103,6 +219,23 @@ class TypeChecker:
             if actual_type != "any" and expected_type != actual_type:
                 raise TypeSystemError(f"Cannot assign expression of type '{actual_type}' to variable '{var}' of type '{expected_type}'.")
 
+    def collection_type(self, name, env, action, objects=True):
+        """The declared type of a variable used as a list (or object), or an error if it is neither."""
+        name = name.strip()
+        if not re.fullmatch(r'\w+', name):
+            return "any"
+        var_type = env.get_type(name)
+        if var_type == "any" or _LIST_TYPE_RE.match(var_type) or (objects and var_type == "Object"):
+            return var_type
+        raise TypeSystemError(f"Cannot {action} '{name}' of type '{var_type}'.")
+
+    def check_item(self, expr, list_type, name, env):
+        """Checks that a value can go into a list declared as 'List of X'."""
+        item_type = _element_type(list_type)
+        actual_type = self.get_expression_type(expr, env)
+        if item_type != "any" and actual_type != "any" and actual_type != item_type:
+            raise TypeSystemError(f"Cannot put a value of type '{actual_type}' in '{name}', a {list_type}.")
+
     def get_expression_type(self, expr, env):
 
         expr = expr.strip()
@@ -123,6 +256,13 @@ class TypeChecker:
             return "Boolean"
         if expr.lower().startswith("not "):
             return "Boolean"
+        if " contains " in expr or " does not contain " in expr:
+            return "Boolean"
+
+        # Indexing into a typed list
+        index_match = re.fullmatch(r"(\w+)\[.+\]", expr)
+        if index_match:
+            return _element_type(env.get_type(index_match.group(1)))
 
         # Property Access
         prop_match = re.fullmatch(r"(\w+)'s (\w+)", expr, re.I)
@@ -131,8 +271,13 @@ class TypeChecker:
             obj_type_name = self.get_expression_type(obj_name, env)
             class_def = self.interpreter.classes.get(obj_type_name)
             if not class_def:
+                if obj_type_name == "any":
+                    return "any"
+                if obj_type_name in _SIZED_TYPES or _LIST_TYPE_RE.match(obj_type_name):
+                    # Their length is a Number; an object's other keys can hold anything.
+                    return "Number" if prop_name.lower() == 'length' else "any"
                 raise TypeSystemError(f"Cannot access property on non-class variable '{obj_name}' of type '{obj_type_name}'.")
-            prop_type = class_def.properties.get(prop_name)
+            prop_type = class_def.property_types.get(prop_name)
             if not prop_type:
                 raise TypeSystemError(f"Class '{obj_type_name}' has no declared property '{prop_name}'.")
             return prop_type
@@ -157,7 +302,7 @@ class TypeChecker:
 
     def check_if(self, block, env):
 
-        condition_str = re.match(r'if (.+) then', block[0], re.I).group(1)
+        condition_str = re.match(r'if (.+) then', block[0].text, re.I).group(1)
         condition_type = self.get_expression_type(condition_str, env)
         if condition_type not in ["Boolean", "any"]:
             raise TypeSystemError(f"If condition must be a Boolean, but it is of type '{condition_type}'.")
@@ -167,7 +312,7 @@ class TypeChecker:
 
     def check_while(self, block, env):
 
-        condition_str = re.match(r'while (.+) is true', block[0], re.I).group(1)
+        condition_str = re.match(r'while (.+?)(?: is true)?$', block[0].text, re.I).group(1)
         condition_type = self.get_expression_type(condition_str, env)
         if condition_type not in ["Boolean", "any"]:
             raise TypeSystemError(f"While loop condition must be a Boolean, but it is of type '{condition_type}'.")
@@ -177,9 +322,17 @@ class TypeChecker:
 
     def check_for(self, block, env):
 
-        match = re.match(r'for each (\w+) in (\w+)', block[0], re.I)
+        match = re.match(r'for each (\w+) in the file ', block[0].text, re.I)
+        if match:
+            # Each item is one line of the file, without its line break.
+            loop_env = Environment(outer=env)
+            loop_env.declare(match.group(1), "String")
+            self.check(block[1:], loop_env)
+            return
+
+        match = re.match(r'for each (\w+) in (\w+)', block[0].text, re.I)
         if not match:
-             raise TypeSystemError(f"Invalid for loop syntax: '{block[0]}'")
+             raise TypeSystemError(f"Invalid for loop syntax: '{block[0].text}'")
         item_var, list_var = match.groups()
 
         list_type_str = self.get_expression_type(list_var, env)
@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import asyncio
+import argparse
+import threading
+import contextvars
+from .core.interpreter import HumanLang
+from .core.modules import ModuleRegistry
+from .core.http import HttpClient
+from .core.parallel import ParallelRunner
+from .core.parser import describe
+from .client import default_socket
+
+# Where print() output goes for the run whose code is executing.
+_output = contextvars.ContextVar('humanlang_run_output', default=None)
+
+
+class RunOutput:
+    """
+    Stands in for sys.stdout in the server. Text goes to the client of the run
+    that printed it, including from that run's background tasks and threads,
+    which inherit the run's context; anything else goes to the real stdout.
+    """
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, text):
+        return (_output.get() or self.fallback).write(text)
+
+    def flush(self):
+        target = _output.get()
+        if target is None:
+            self.fallback.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+class _Reply:
+    """One run's output, sent to its client as {"stdout": text} lines."""
+    def __init__(self, writer):
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.thread = threading.get_ident()
+
+    def write(self, text):
+        if text:
+            self.send({'stdout': text})
+        return len(text)
+
+    def send(self, message):
+        data = json.dumps(message).encode() + b'\n'
+        if threading.get_ident() == self.thread:
+            self.writer.write(data)
+        else:  # printed from a worker thread, e.g. a ping
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+
+
+class Server:
+    """
+    Runs scripts sent over a Unix socket inside one long-lived process, so each
+    run skips starting Python, importing scapy and aiohttp, spinning up HTTP
+    connection pools and worker processes, and unpickling compiled programs: all
+    of those are kept for the server's lifetime.
+
+    Every run gets its own interpreter: its own global variables, task counters,
+    open files, and a fresh run of each library it uses, built from the compiled
+    programs kept in memory, so no state leaks from one run to the next. Runs take
+    turns, because each one runs in the client's working directory.
+
+    A client sends one JSON line, {"script": path, "cwd": directory}, and gets
+    back {"stdout": text} lines followed by {"exit": status, "seconds": time}.
+    """
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or default_socket()
+        self.http = HttpClient()
+        self.parallel = ParallelRunner()
+        self.programs = {}  # path -> CompiledProgram, checked against the file on every run
+        self._turn = None
+        self._server = None
+
+    async def serve(self):
+        self._turn = asyncio.Lock()
+        self._claim_socket()
+        # Running a script is as good as a shell, so the socket is created for this user only.
+        umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        finally:
+            os.umask(umask)
+        print(f"humanlang server listening on {self.socket_path}", file=sys.stderr)
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, lambda: stopped.done() or stopped.set_result(None))
+        try:
+            async with self._server:
+                await stopped
+        finally:
+            await self.close()
+
+    def _claim_socket(self):
+        """Removes a socket left behind by a server that is gone, refusing to replace a live one."""
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+                return
+        raise RuntimeError(f"A humanlang server is already listening on {self.socket_path}.")
+
+    async def close(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        await self.http.close()
+        await asyncio.to_thread(self.parallel.close)
+
+    async def handle(self, reader, writer):
+        reply = _Reply(writer)
+        try:
+            request = json.loads(await reader.readline())
+            async with self._turn:
+                started = time.perf_counter()
+                status = await self.run(request['script'], request.get('cwd'), reply)
+            reply.send({'exit': status, 'seconds': time.perf_counter() - started})
+            await writer.drain()
+        except (ValueError, KeyError, TypeError):
+            reply.send({'stdout': "Error: the request must be a JSON object with a 'script' path.\n"})
+            reply.send({'exit': 2})
+        except ConnectionError:
+            pass  # the client went away
+        finally:
+            writer.close()
+
+    async def run(self, path, cwd, reply):
+        """Runs one script with its output going to 'reply', returning its exit status."""
+        interpreter = HumanLang(registry=ModuleRegistry(), http=self.http, parallel=self.parallel,
+                                programs=self.programs)
+        home = os.getcwd()
+        token = _output.set(reply)
+        try:
+            if cwd:
+                os.chdir(cwd)
+            await interpreter.run_from_file(path)
+            return 0
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"An unexpected error occurred: {describe(e)}")
+            return 1
+        finally:
+            await interpreter.scheduler.cancel_all()  # tasks the script started and never awaited
+            interpreter.files.close_all()
+            _output.reset(token)
+            os.chdir(home)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='humanlang serve',
+                                     description="Keep an interpreter running and run scripts sent by 'humanlang client'.")
+    parser.add_argument('--socket', metavar='PATH', help=f"where to listen (default: {default_socket()})")
+    args = parser.parse_args(argv)
+    sys.stdout = RunOutput(sys.stdout)
+    sys.stdin = open(os.devnull)  # scripts run here cannot 'ask': the client's terminal is not attached
+    try:
+        asyncio.run(Server(args.socket).serve())
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
@@ -6,6 +6,7 @@ setup(
     name="humanlang",
     version="3.0.0", 
     packages=find_packages(),
+    package_data={'humanlang.bench': ['workloads/*.human']},
     author="Duong Dinh",
     author_email="bobdinh139@gmail.com",
     description="An object-oriented, asynchronous language with advanced networking tools.",
@@ -17,6 +18,9 @@ setup(
         'aiohttp>=3.8.0',
         'scapy>=2.5.0', 
     ],
+    extras_require={
+        'fast': ['numpy'],  # speeds up packet aggregation
+    },
     entry_points={
         'console_scripts': [
             'humanlang=humanlang.__main__:main',